@@ -0,0 +1,397 @@
+"""Versioned JSON API of venues, artists, shows and cities."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import hashlib
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import aliased, joinedload, selectinload, load_only
+from models import db, City, Venue, Artist, Show, Genre
+from pagination import paginate
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+API_VERSION = 'v1'
+
+# Related resources embedded per resource of a list page by a to many include, a single resource embeds all of them.
+MAX_INCLUDED = 20
+
+api = Blueprint(f'api_{API_VERSION}', __name__, url_prefix=f'/api/{API_VERSION}')
+
+
+class APIError(Exception):
+    """Error answered with a JSON body."""
+
+    def __init__(self, message, status_code=400):
+        """
+        Initialize error.
+
+        :param message:
+        :param status_code:
+        """
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+# ==================================================================================================================== #
+# Resources.
+# ==================================================================================================================== #
+
+class Resource:
+    """
+    Model exposed by the API along with the fields and relationships clients may ask for.
+
+    Clients pick fields with `?fields=id,name` and embed relationships with `?include=city,shows`. Only the picked
+    columns are loaded, to one relationships are joined and to many relationships are loaded by one extra query each,
+    of at most MAX_INCLUDED rows per resource on list pages.
+    """
+
+    def __init__(self, model, fields, includes=None):
+        """
+        Initialize resource.
+
+        :param model:
+        :param fields: names of the columns exposed by default.
+        :param includes: relationship name -> name of the resource it points to.
+        """
+        self.model = model
+        self.fields = fields
+        self.includes = includes or {}
+
+    def parse_fields(self, value):
+        """
+        Fields asked for by the `fields` parameter, the id is always part of them.
+
+        :param value:
+        :return:
+        """
+        if not value:
+            return self.fields
+
+        fields = [field for field in value.split(',') if field]
+        unknown = [field for field in fields if field not in self.fields]
+        if unknown:
+            raise APIError(f"Unknown fields: {', '.join(unknown)}.")
+        return ('id', *[field for field in fields if field != 'id'])
+
+    def parse_includes(self, value):
+        """
+        Relationships asked for by the `include` parameter.
+
+        :param value:
+        :return:
+        """
+        includes = tuple(include for include in (value or '').split(',') if include)
+        unknown = [include for include in includes if include not in self.includes]
+        if unknown:
+            raise APIError(f"Unknown includes: {', '.join(unknown)}.")
+        return includes
+
+    def relationship(self, include):
+        """
+        Relationship property of the include.
+
+        :param include:
+        :return:
+        """
+        return inspect(self.model).relationships[include]
+
+    def load_options(self, fields, includes, to_many=True):
+        """
+        Query options loading the fields and included relationships only.
+
+        :param fields:
+        :param includes:
+        :param to_many: whether to load the to many relationships as well.
+        :return:
+        """
+        options = [load_only(*fields)]
+        for include in includes:
+            if self.relationship(include).uselist:
+                if to_many:
+                    options.append(selectinload(include).load_only(*RESOURCES[self.includes[include]].fields))
+            else:
+                options.append(joinedload(include).load_only(*RESOURCES[self.includes[include]].fields))
+        return options
+
+    def query(self, fields, includes, to_many=True):
+        """
+        Query of the resource loading the fields and included relationships only.
+
+        :param fields:
+        :param includes:
+        :param to_many: whether to load the to many relationships as well, see `load_included`.
+        :return:
+        """
+        return self.model.query.options(*self.load_options(fields, includes, to_many))
+
+    def load_included(self, instances, include, limit=MAX_INCLUDED):
+        """
+        Load the first related rows of a to many include of the instances, by id, with a single query.
+
+        :param instances:
+        :param include:
+        :param limit: rows per instance.
+        :return: instance id -> related rows.
+        """
+        relationship = self.relationship(include)
+        (local, remote), = relationship.local_remote_pairs
+        target = relationship.mapper.class_
+        position = db.func.row_number().over(partition_by=remote, order_by=target.id).label('position')
+        ranked = db.session.query(target, position).filter(
+            remote.in_([getattr(instance, local.key) for instance in instances])
+        ).subquery()
+        ranked_target = aliased(target, ranked)
+
+        rows = db.session.query(ranked_target).options(
+            load_only(*RESOURCES[self.includes[include]].fields)
+        ).filter(
+            ranked.c.position <= limit
+        ).order_by(
+            ranked.c[remote.key], ranked.c.id
+        )
+        related = {getattr(instance, local.key): [] for instance in instances}
+        for row in rows:
+            related[getattr(row, remote.key)].append(row)
+        return related
+
+    def version(self, resource_id, includes):
+        """
+        Version of the resource and of the included rows, fetched by a single indexed lookup.
+
+        The latest modification time misses included rows deleted or moved to another resource, and shows have none of
+        their own, so every to many include adds the count and a digest of the ids of its rows.
+
+        :param resource_id:
+        :param includes:
+        :return: (naive UTC latest modification time, digest of the to many includes, empty without them), None if the
+            resource does not exist or has no modification time.
+        """
+        times, members = [self.model.modified_at], []
+        for include in includes:
+            relationship = self.relationship(include)
+            target = relationship.mapper.class_
+            if hasattr(target, 'modified_at'):
+                times.append(
+                    db.select([db.func.max(target.modified_at)]).where(relationship.primaryjoin).as_scalar()
+                )
+            if relationship.uselist:
+                ids = db.func.string_agg(db.cast(target.id, db.Text), aggregate_order_by(',', target.id))
+                members.append(
+                    db.select([db.func.concat(db.func.count(), ':', db.func.md5(ids))]).where(
+                        relationship.primaryjoin
+                    ).as_scalar()
+                )
+
+        # Modification times are naive in the time zone of the database session, HTTP dates are in UTC.
+        latest = db.func.timezone('UTC', db.cast(db.func.greatest(*times), db.DateTime(timezone=True)))
+        row = db.session.query(
+            latest, db.func.concat_ws(';', *members) if members else db.literal('')
+        ).filter(self.model.id == resource_id).first()
+        return None if row is None or row[0] is None else tuple(row)
+
+    def serialize(self, instance, fields, includes=(), included=None):
+        """
+        Serialize model instance.
+
+        :param instance:
+        :param fields:
+        :param includes:
+        :param included: include -> instance id -> related rows loaded by `load_included`.
+        :return:
+        """
+        serialized_data = {field: getattr(instance, field) for field in fields}
+        for include in includes:
+            resource = RESOURCES[self.includes[include]]
+            if included and include in included:
+                related = included[include][instance.id]
+            else:
+                related = getattr(instance, include)
+            if self.relationship(include).uselist:
+                serialized_data[include] = [resource.serialize(item, resource.fields) for item in related]
+            else:
+                serialized_data[include] = resource.serialize(related, resource.fields) if related else None
+        return serialized_data
+
+
+RESOURCES = {
+    'cities': Resource(
+        City, ('id', 'name', 'state', 'latitude', 'longitude'), {'venues': 'venues', 'artists': 'artists'}
+    ),
+    'venues': Resource(
+        Venue,
+        (
+            'id', 'name', 'address', 'phone', 'website', 'image_link', 'facebook_link', 'seeking_talent',
+            'seeking_description', 'genres', 'city_id', 'latitude', 'longitude', 'upcoming_shows_count',
+            'past_shows_count', 'next_show_time', 'created_at', 'modified_at',
+        ),
+        {'city': 'cities', 'shows': 'shows'}
+    ),
+    'artists': Resource(
+        Artist,
+        (
+            'id', 'name', 'phone', 'website', 'image_link', 'facebook_link', 'seeking_venue', 'seeking_description',
+            'genres', 'city_id', 'upcoming_shows_count', 'past_shows_count', 'next_show_time', 'created_at',
+            'modified_at',
+        ),
+        {'city': 'cities', 'shows': 'shows'}
+    ),
+    'shows': Resource(Show, ('id', 'start_time', 'venue_id', 'artist_id'), {'venue': 'venues', 'artist': 'artists'}),
+    'genres': Resource(Genre, ('id', 'name')),
+}
+
+
+# ==================================================================================================================== #
+# Helpers.
+# ==================================================================================================================== #
+
+def get_resource(name):
+    """
+    Get resource by name.
+
+    :param name:
+    :return:
+    """
+    if name not in RESOURCES:
+        raise APIError(f'Unknown resource {name}.', 404)
+    return RESOURCES[name]
+
+
+def entity_tag(name, resource_id, version, fields, includes):
+    """
+    Entity tag of a resource representation, it changes along with the resource and the fields and includes.
+
+    :param name:
+    :param resource_id:
+    :param version: see `Resource.version`.
+    :param fields:
+    :param includes:
+    :return:
+    """
+    last_modified, members = version
+    key = (
+        f"{API_VERSION}:{name}:{resource_id}:{last_modified.isoformat()}:{members}:"
+        f"{','.join(fields)}:{','.join(includes)}"
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def is_not_modified(etag, last_modified):
+    """
+    Whether the conditional headers of the request match the current version of the resource.
+
+    If-None-Match takes precedence over If-Modified-Since, which only has a precision of one second and is ignored
+    without last_modified.
+
+    :param etag:
+    :param last_modified:
+    :return:
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Set the ETag header and the Last-Modified header when there is a modification time.
+
+    :param response:
+    :param etag:
+    :param last_modified:
+    :return:
+    """
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+
+# ==================================================================================================================== #
+# Routes.
+# ==================================================================================================================== #
+
+@api.errorhandler(APIError)
+def api_error(error):
+    """
+    Answer API errors with a JSON body.
+
+    :param error:
+    :return:
+    """
+    return jsonify(error=error.message), error.status_code
+
+
+@api.route('/<name>')
+def list_resources(name):
+    """
+    Get a page of resources ordered by id, to many includes embed at most MAX_INCLUDED related resources each.
+
+    :param name:
+    :return:
+    """
+    resource = get_resource(name)
+    fields = resource.parse_fields(request.args.get('fields'))
+    includes = resource.parse_includes(request.args.get('include'))
+    rows, next_cursor, prev_cursor = paginate(
+        resource.query(fields, includes, to_many=False), (resource.model.id,), lambda instance: [instance.id],
+        request.args.get('cursor'), request.args.get('page_size')
+    )
+    included = {
+        include: resource.load_included(rows, include)
+        for include in includes if resource.relationship(include).uselist
+    }
+    response = jsonify(
+        data=[resource.serialize(instance, fields, includes, included) for instance in rows],
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
+    )
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@api.route('/<name>/<int:resource_id>')
+def get_resource_by_id(name, resource_id):
+    """
+    Get a resource, answered with 304 Not Modified when the client already has its current version.
+
+    :param name:
+    :param resource_id:
+    :return:
+    """
+    resource = get_resource(name)
+    fields = resource.parse_fields(request.args.get('fields'))
+    includes = resource.parse_includes(request.args.get('include'))
+
+    version = None
+    if hasattr(resource.model, 'modified_at'):
+        version = resource.version(resource_id, includes)
+
+    etag = last_modified = None
+    if version is not None:
+        etag = entity_tag(name, resource_id, version, fields, includes)
+        # Deleted or moved rows of to many includes leave no modification time, those are told by the entity tag only.
+        if not version[1]:
+            last_modified = version[0]
+        if is_not_modified(etag, last_modified):
+            response = current_app.response_class(status=304)
+            set_validators(response, etag, last_modified)
+            return response
+
+    instance = resource.query(fields, includes).filter(resource.model.id == resource_id).first()
+    if instance is None:
+        raise APIError(f'{name} {resource_id} does not exist.', 404)
+
+    response = jsonify(data=resource.serialize(instance, fields, includes))
+    if etag is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
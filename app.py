@@ -4,47 +4,91 @@
 
 
 import logging
+from datetime import datetime
+from enum import Enum
 from logging import Formatter, FileHandler
 
+from flask import Flask
+from flask.json import JSONEncoder
+
+import assets
+import instrumentation
+import streaming
+import timing
+from api import api
+from cache import page_cache
+from commands import commands
+from config import get_config
+from controllers import main, internal
 from filters import format_datetime
-from controllers import *
+from models import db, migrate, moment, City
 
 
 # ==================================================================================================================== #
-# Filters.
+# App Config.
 # ==================================================================================================================== #
 
-app.jinja_env.filters['datetime'] = format_datetime
+class AppJSONEncoder(JSONEncoder):
+    """JSON encoder writing datetimes in ISO 8601 format and enums by name."""
 
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        if isinstance(o, Enum):
+            return o.name
+        return super().default(o)
 
-# ==================================================================================================================== #
-# Controllers.
-# ==================================================================================================================== #
 
-@app.route('/')
-def index():
-    return render_template('pages/home.html')
+def warm_caches():
+    City.warm_ids_cache()
+
+
+def create_app(config=None):
+    """
+    Create app, bind the extensions and register the hooks, blueprints and template filters.
+
+    Every worker process of the WSGI server creates its own app, see `wsgi.py`.
+
+    :param config: config object, the one picked by the environment by default.
+    :return:
+    """
+    app = Flask(__name__)
+    app.config.from_object(config or get_config())
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError('SECRET_KEY must be set, every worker process signs sessions and tokens with it.')
+    app.json_encoder = AppJSONEncoder
 
+    moment.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    page_cache.init_app(app)
+    instrumentation.init_app(app)
+    timing.init_app(app)
+    streaming.init_app(app)
+    assets.init_app(app)
 
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('errors/404.html'), 404
+    app.register_blueprint(main)
+    if app.debug or app.config.get('INTERNAL_ENDPOINTS_ENABLED'):
+        app.register_blueprint(internal)
+    app.register_blueprint(api)
+    app.register_blueprint(assets.assets)
+    app.register_blueprint(commands)
 
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.before_first_request(warm_caches)
 
-@app.errorhandler(500)
-def server_error(error):
-    return render_template('errors/500.html'), 500
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
 
+    return app
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
 
 # ==================================================================================================================== #
 # Launch.
@@ -52,11 +96,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
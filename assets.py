@@ -0,0 +1,299 @@
+"""Build and serving of fingerprinted static assets."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import Blueprint, current_app, request, send_from_directory, url_for, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Bundles built by concatenating and minifying their sources, paths are relative to the static folder.
+BUNDLES = {
+    'css/app.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+}
+
+DIST_DIR = 'dist'
+
+MANIFEST_NAME = 'manifest.json'
+
+# Characters of the content hash inserted into the file names.
+FINGERPRINT_LENGTH = 12
+
+# Fingerprinted files never change, browsers may keep them for a year without revalidating.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.map', '.eot', '.ttf', '.otf')
+
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+# Comments, and the string literals and url() references minifying must leave untouched.
+CSS_TOKEN_PATTERN = re.compile(r'''
+    (/\*.*?\*/)
+    | (
+        url\(\s*(?:"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|[^)]*)\s*\)
+        | "(?:\\.|[^"\\])*"
+        | '(?:\\.|[^'\\])*'
+    )
+''', re.S | re.X)
+
+assets = Blueprint('assets', __name__)
+
+
+# ==================================================================================================================== #
+# Build.
+# ==================================================================================================================== #
+
+def minify_css(css):
+    """
+    Strip comments and insignificant whitespace of a stylesheet.
+
+    String literals and url() references are set aside while whitespace is collapsed and put back as they were.
+
+    :param css:
+    :return:
+    """
+    literals = []
+
+    def set_aside(match):
+        if match.group(1):
+            return ''
+        literals.append(match.group(2))
+        return f'\0{len(literals) - 1}\0'
+
+    css = CSS_TOKEN_PATTERN.sub(set_aside, css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}').strip()
+    return re.sub(r'\0(\d+)\0', lambda match: literals[int(match.group(1))], css)
+
+
+def fingerprinted_name(path, content):
+    """
+    File name of the path with the hash of its content inserted before the extension.
+
+    :param path:
+    :param content:
+    :return:
+    """
+    root, extension = posixpath.splitext(path)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:FINGERPRINT_LENGTH]}{extension}'
+
+
+def rewrite_css_urls(css, source_path, bundle_path, manifest):
+    """
+    Point the url() references of a stylesheet moved into a bundle to the fingerprinted files, files which are not
+    fingerprinted are referenced by their static URL.
+
+    :param css:
+    :param source_path: path of the stylesheet relative to the static folder.
+    :param bundle_path: path of the bundle relative to the static folder.
+    :param manifest: asset path -> fingerprinted path map.
+    :return:
+    """
+    def rewrite(match):
+        url = match.group(2)
+        if re.match(r'^(?:[a-z]+:|/|#)', url):
+            return match.group(0)
+
+        target, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source_path), target))
+        fingerprinted = manifest.get(path)
+        if fingerprinted is None:
+            url = f'{current_app.static_url_path}/{path}'
+        else:
+            url = posixpath.relpath(fingerprinted, posixpath.dirname(bundle_path))
+        return f'url("{url}{suffix}")'
+
+    return CSS_URL_PATTERN.sub(rewrite, css)
+
+
+def write_asset(dist_folder, path, content):
+    """
+    Write an asset into the dist folder along with its precompressed variants.
+
+    :param dist_folder:
+    :param path:
+    :param content:
+    :return:
+    """
+    destination = os.path.join(dist_folder, path)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with open(destination, 'wb') as asset_file:
+        asset_file.write(content)
+
+    if path.endswith(COMPRESSED_EXTENSIONS):
+        with open(f'{destination}.gz', 'wb') as asset_file:
+            asset_file.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(f'{destination}.br', 'wb') as asset_file:
+                asset_file.write(brotli.compress(content))
+
+
+def build(static_folder=None):
+    """
+    Fingerprint static files and build the bundles into the dist folder, then write the manifest.
+
+    Fingerprinted files of previous builds are kept, so pages rendered before a deploy still find their assets.
+
+    :param static_folder:
+    :return: asset path -> fingerprinted path map.
+    """
+    static_folder = static_folder or current_app.static_folder
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+
+    for directory, directories, files in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(dist_folder):
+            directories[:] = []
+            continue
+        for name in files:
+            if name.startswith('.'):
+                continue
+            path = posixpath.join(*os.path.relpath(os.path.join(directory, name), static_folder).split(os.sep))
+            with open(os.path.join(directory, name), 'rb') as asset_file:
+                content = asset_file.read()
+            manifest[path] = fingerprinted_name(path, content)
+            write_asset(dist_folder, manifest[path], content)
+
+    for bundle_path, sources in BUNDLES.items():
+        parts = []
+        for source_path in sources:
+            with open(os.path.join(static_folder, source_path), encoding='utf-8') as source_file:
+                parts.append(rewrite_css_urls(source_file.read(), source_path, bundle_path, manifest))
+        content = minify_css('\n'.join(parts)).encode('utf-8')
+        manifest[bundle_path] = fingerprinted_name(bundle_path, content)
+        write_asset(dist_folder, manifest[bundle_path], content)
+
+    # Replace the manifest at once, running processes reload it on their next lookup.
+    manifest_path = os.path.join(dist_folder, MANIFEST_NAME)
+    with open(f'{manifest_path}.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+    return manifest
+
+
+# ==================================================================================================================== #
+# Template Helpers.
+# ==================================================================================================================== #
+
+class Manifest:
+    """Manifest of the last build, reloaded when the build writes a new one."""
+
+    def __init__(self, path):
+        """
+        Initialize manifest.
+
+        :param path:
+        """
+        self.path = path
+        self.mtime = None
+        self.entries = {}
+
+    def get(self, asset_path):
+        """
+        Get fingerprinted path of the asset, None if it was not built.
+
+        :param asset_path:
+        :return:
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+        if mtime != self.mtime:
+            with open(self.path) as manifest_file:
+                self.entries = json.load(manifest_file)
+            self.mtime = mtime
+        return self.entries.get(asset_path)
+
+
+def asset_url(path):
+    """
+    URL of a static asset, the fingerprinted one once assets are built.
+
+    :param path: path relative to the static folder.
+    :return:
+    """
+    fingerprinted = current_app.extensions['asset_manifest'].get(path)
+    if fingerprinted is None:
+        return url_for('static', filename=path)
+    return url_for('assets.asset', filename=fingerprinted)
+
+
+def asset_urls(path):
+    """
+    URLs of a bundle, the built bundle or its sources when assets are not built.
+
+    :param path: path of the bundle relative to the static folder.
+    :return:
+    """
+    if current_app.extensions['asset_manifest'].get(path) is None:
+        return [url_for('static', filename=source) for source in BUNDLES[path]]
+    return [asset_url(path)]
+
+
+# ==================================================================================================================== #
+# Serving.
+# ==================================================================================================================== #
+
+@assets.route('/assets/<path:filename>')
+def asset(filename):
+    """
+    Serve a fingerprinted asset with immutable caching, precompressed when the client accepts it.
+
+    :param filename:
+    :return:
+    """
+    dist_folder = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename == MANIFEST_NAME or filename.endswith(('.gz', '.br')):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate, extension in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in request.accept_encodings and os.path.isfile(os.path.join(dist_folder, filename + extension)):
+            encoding = candidate
+            filename += extension
+            break
+
+    response = send_from_directory(dist_folder, filename, mimetype=mimetype, cache_timeout=IMMUTABLE_MAX_AGE)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    """
+    Load the manifest of app and expose the asset helpers to its templates.
+
+    :param app:
+    :return:
+    """
+    app.extensions['asset_manifest'] = Manifest(os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME))
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
@@ -0,0 +1,405 @@
+"""Benchmark of app routes against deterministic synthetic catalogs."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import json
+import random
+import time
+from datetime import datetime, timedelta
+import babel.dates
+import dateutil.parser
+from flask import current_app
+from flask_migrate import upgrade
+from sqlalchemy import event
+from constants import STATES, GENRES
+from models import db, City, Venue, Artist, Show
+from cache import page_cache
+from filters import format_datetime, format_cached, DATE_FORMATS
+import dummy_data
+import partitions
+import geo
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Number of shows of every scale, venues and artists are derived from it.
+SCALES = {
+    '1k': 1000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+INSERT_BATCH_SIZE = 10000
+
+# Allowed growth of p95 latency over the baseline before a comparison run fails.
+LATENCY_TOLERANCE = 0.5
+
+
+# ==================================================================================================================== #
+# Dataset.
+# ==================================================================================================================== #
+
+def insert_batches(table, rows):
+    """
+    Insert rows into the table in batches.
+
+    :param table:
+    :param rows: iterable of column values.
+    :return:
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def generate_catalog(scale, seed=0):
+    """
+    Generate a deterministic catalog of cities, venues, artists and shows shaped like the dummy data.
+
+    :param scale: key of SCALES.
+    :param seed:
+    :return:
+    """
+    rng = random.Random(seed)
+    shows_count = SCALES[scale]
+    venues_count = max(10, shows_count // 50)
+    artists_count = max(10, shows_count // 20)
+
+    venue_samples = [dummy_data.venue_1, dummy_data.venue_2, dummy_data.venue_3]
+    artist_samples = [dummy_data.artist_1, dummy_data.artist_2, dummy_data.artist_3]
+    genres = [genre for genre, label in GENRES]
+    cities = [(sample['city'], sample['state']) for sample in venue_samples]
+    cities += [(f'City {index}', rng.choice(STATES)[0]) for index in range(max(1, venues_count // 20))]
+    city_ids = list(City.get_city_ids(cities).values())
+
+    def venues():
+        for index in range(venues_count):
+            sample = venue_samples[index % len(venue_samples)]
+            yield {
+                'name': f"{sample['name']} {index}",
+                'address': sample['address'],
+                'phone': sample['phone'],
+                'website': sample['website'],
+                'image_link': sample['image_link'],
+                'facebook_link': sample['facebook_link'],
+                'seeking_talent': sample['seeking_talent'],
+                'seeking_description': sample.get('seeking_description'),
+                'genres': rng.sample(genres, 3),
+                'city_id': rng.choice(city_ids),
+            }
+
+    def artists():
+        for index in range(artists_count):
+            sample = artist_samples[index % len(artist_samples)]
+            yield {
+                'name': f"{sample['name']} {index}",
+                'phone': sample['phone'],
+                'website': sample.get('website'),
+                'image_link': sample['image_link'],
+                'facebook_link': sample.get('facebook_link'),
+                'seeking_venue': sample['seeking_venue'],
+                'seeking_description': sample.get('seeking_description'),
+                'genres': rng.sample(genres, 2),
+                'city_id': rng.choice(city_ids),
+            }
+
+    insert_batches(Venue.__table__, venues())
+    insert_batches(Artist.__table__, artists())
+    geo.geocode(geo.load_lookup())
+    venue_ids = [venue_id for venue_id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [artist_id for artist_id, in db.session.query(Artist.id).order_by(Artist.id)]
+
+    # Shows are spread over two years around a fixed date so every run generates the same past and upcoming shows.
+    origin = datetime(2020, 1, 1)
+    insert_batches(Show.__table__, (
+        {
+            'venue_id': rng.choice(venue_ids),
+            'artist_id': rng.choice(artist_ids),
+            'start_time': origin + timedelta(hours=rng.randrange(-365 * 24, 365 * 24)),
+        }
+        for index in range(shows_count)
+    ))
+    partitions.create_partitions()
+    Venue.refresh_show_counters()
+    Artist.refresh_show_counters()
+    db.session.commit()
+
+
+# ==================================================================================================================== #
+# Measurement.
+# ==================================================================================================================== #
+
+class QueryCounter:
+    """Count statements and fetched rows executed by the engines while active."""
+
+    def __init__(self, engines):
+        """
+        Initialize counter.
+
+        :param engines: the primary engine and the read replica ones.
+        """
+        self.engines = engines
+        self.queries = 0
+        self.rows = 0
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """
+        Count statement and the rows it returned.
+
+        :return:
+        """
+        self.queries += 1
+        if cursor.description is not None and cursor.rowcount > 0:
+            self.rows += cursor.rowcount
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+
+def get_routes():
+    """
+    Routes benchmarked as (name, method, url, form data), ids point at existing rows of the catalog.
+
+    :return:
+    """
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    city_id = db.session.query(Venue.city_id).filter(Venue.id == venue_id).scalar()
+    busiest_venue_id = db.session.query(Show.venue_id).group_by(Show.venue_id).order_by(
+        db.func.count().desc()
+    ).limit(1).scalar()
+
+    return [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('venues_json', 'GET', '/venues.json', None),
+        ('venues_genre_json', 'GET', '/venues.json?genre=Jazz', None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': 'Hop'}),
+        ('search_venues_json', 'GET', '/venues/search.json?search_term=Hop', None),
+        ('venues_near', 'GET', '/venues/near?latitude=37.7749&longitude=-122.4194&radius=50', None),
+        ('venues_near_json', 'GET', '/venues/near.json?latitude=37.7749&longitude=-122.4194&radius=50', None),
+        ('show_venue', 'GET', f'/venues/{venue_id}', None),
+        ('show_busiest_venue', 'GET', f'/venues/{busiest_venue_id}', None),
+        ('edit_venue', 'GET', f'/venues/{venue_id}/edit', None),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('artists', 'GET', '/artists', None),
+        ('artists_json', 'GET', '/artists.json', None),
+        ('artists_genre_json', 'GET', '/artists.json?genre=Jazz', None),
+        ('search_artists', 'POST', '/artists/search', {'search_term': 'Sax'}),
+        ('search_artists_json', 'GET', '/artists/search.json?search_term=Sax', None),
+        ('show_artist', 'GET', f'/artists/{artist_id}', None),
+        ('edit_artist', 'GET', f'/artists/{artist_id}/edit', None),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('shows', 'GET', '/shows', None),
+        ('shows_json', 'GET', '/shows.json', None),
+        ('create_show_form', 'GET', '/shows/create', None),
+        # Calendars around the origin of the catalog shows, see `generate_catalog`.
+        ('calendar_day', 'GET', '/calendar/day/2020-01-10', None),
+        ('calendar_week', 'GET', '/calendar/week/2020-01-10', None),
+        ('calendar_month', 'GET', '/calendar/month/2020-01-10', None),
+        ('city_calendar_month', 'GET', f'/cities/{city_id}/calendar/month/2020-01-10', None),
+        ('venue_calendar_month', 'GET', f'/venues/{busiest_venue_id}/calendar/month/2020-01-10', None),
+        ('artist_calendar_month', 'GET', f'/artists/{artist_id}/calendar/month/2020-01-10', None),
+        ('api_venues', 'GET', '/api/v1/venues', None),
+        ('api_venues_include', 'GET', '/api/v1/venues?include=city,shows', None),
+        ('api_venue', 'GET', f'/api/v1/venues/{busiest_venue_id}?include=shows', None),
+        ('api_artists', 'GET', '/api/v1/artists?fields=id,name,upcoming_shows_count', None),
+        ('api_shows', 'GET', '/api/v1/shows?include=venue,artist', None),
+        ('api_cities', 'GET', '/api/v1/cities', None),
+    ]
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile of the values.
+
+    :param values:
+    :param fraction:
+    :return:
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(iterations=20, use_cache=False):
+    """
+    Run every route through the test client and report latency percentiles, query and row counts.
+
+    :param iterations:
+    :param use_cache: keep the page cache, by default it is cleared before every request.
+    :return:
+    """
+    client = current_app.test_client()
+    # GET requests read from the replicas when there are any.
+    engines = [db.get_engine(), *db.get_replica_engines()]
+    report = {}
+    for name, method, url, data in get_routes():
+        latencies = []
+        queries = []
+        rows = []
+        for iteration in range(iterations):
+            if not use_cache:
+                page_cache.local.clear()
+            with QueryCounter(engines) as counter:
+                started_at = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                # Streamed pages render and query while their body is read.
+                response.get_data()
+                response.close()
+                latencies.append((time.perf_counter() - started_at) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name} responded with {response.status_code}')
+            queries.append(counter.queries)
+            rows.append(counter.rows)
+
+        report[name] = {
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'queries': max(queries),
+            'rows': max(rows),
+        }
+    return report
+
+
+def compare(report, baseline, latency_tolerance=LATENCY_TOLERANCE):
+    """
+    Compare report against baseline, returns list of regressions.
+
+    Any growth of the query count is a regression, it is how a reintroduced N+1 shows up. Latency only regresses
+    above the tolerance to absorb machine noise.
+
+    :param report:
+    :param baseline:
+    :param latency_tolerance:
+    :return:
+    """
+    regressions = []
+    for name, expected in baseline.items():
+        actual = report.get(name)
+        if actual is None:
+            regressions.append(f'{name}: missing from report')
+            continue
+        if actual['queries'] > expected['queries']:
+            regressions.append(f"{name}: {actual['queries']} queries, baseline {expected['queries']}")
+        if actual['p95_ms'] > expected['p95_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 {actual['p95_ms']}ms, baseline {expected['p95_ms']}ms")
+    return regressions
+
+
+def format_report(report):
+    """
+    Format report as a table.
+
+    :param report:
+    :return:
+    """
+    lines = [f"{'route':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'rows':>10}"]
+    for name, result in report.items():
+        lines.append(
+            f"{name:<22}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+            f"{result['queries']:>10}{result['rows']:>10}"
+        )
+    return '\n'.join(lines)
+
+
+def load_baseline(path):
+    """
+    Load baseline report file.
+
+    :param path:
+    :return:
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, report):
+    """
+    Save report as baseline file.
+
+    :param path:
+    :param report:
+    :return:
+    """
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+
+
+def prepare_database(database_uri, scale, seed=0):
+    """
+    Point the app at the benchmark database, migrate it and generate the catalog if it is empty.
+
+    :param database_uri:
+    :param scale:
+    :param seed:
+    :return:
+    """
+    if database_uri == current_app.config['SQLALCHEMY_DATABASE_URI']:
+        raise RuntimeError('Benchmark database must not be the app database, it is filled with synthetic data.')
+
+    current_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    upgrade()
+    if not db.session.query(Venue.query.exists()).scalar():
+        generate_catalog(scale, seed)
+
+
+# ==================================================================================================================== #
+# Micro Benchmarks.
+# ==================================================================================================================== #
+
+def format_datetime_uncached(value, date_format='medium'):
+    """
+    Datetime filter as it was before patterns and values were cached, kept as the micro benchmark reference.
+
+    :param value:
+    :param date_format:
+    :return:
+    """
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, DATE_FORMATS.get(date_format, date_format))
+
+
+def benchmark_datetime_filter(renders=10000, distinct=500, seed=0):
+    """
+    Compare the datetime filter against the uncached reference on a page worth of show tiles.
+
+    :param renders: number of formatted values.
+    :param distinct: number of distinct start times among them.
+    :param seed:
+    :return: milliseconds per implementation.
+    """
+    rng = random.Random(seed)
+    origin = datetime(2020, 1, 1)
+    start_times = [origin + timedelta(hours=rng.randrange(-365 * 24, 365 * 24)) for index in range(distinct)]
+    values = [rng.choice(start_times) for index in range(renders)]
+    string_values = [str(value) for value in values]
+
+    results = {}
+    started_at = time.perf_counter()
+    for value in string_values:
+        format_datetime_uncached(value, 'full')
+    results['uncached_string'] = (time.perf_counter() - started_at) * 1000
+
+    format_cached.cache_clear()
+    started_at = time.perf_counter()
+    for value in values:
+        format_datetime(value, 'full')
+    results['cached_datetime'] = (time.perf_counter() - started_at) * 1000
+
+    return results
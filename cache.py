@@ -0,0 +1,527 @@
+"""Read through cache of rendered pages for app."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import session
+from models import db, Venue, Show
+from routing import reads_from_replica, wrote_within
+from show_calendar import show_bucket_ids
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Invalidations are remembered this long, pages that took longer to render are not cached.
+MAX_RENDER_SECONDS = 60
+
+
+# ==================================================================================================================== #
+# Backends.
+# ==================================================================================================================== #
+
+class LRUCache:
+    """In process least recently used cache with per entry time to live."""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        """
+        Initialize cache.
+
+        :param max_entries:
+        :param ttl: seconds an entry stays valid.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Get value of the key, expired and missing keys return None.
+
+        :param key:
+        :return:
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Set value of the key evicting the least recently used entries above max entries.
+
+        :param key:
+        :param value:
+        :return:
+        """
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Delete the key.
+
+        :param key:
+        :return:
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        """
+        Delete the keys starting with prefix.
+
+        :param prefix:
+        :return:
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+    def clear(self):
+        """
+        Delete all keys.
+
+        :return:
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+class InMemoryBackend:
+    """Shared backend stand in keeping entries in a dict, meant for tests."""
+
+    def __init__(self):
+        """Initialize backend."""
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get value of the key, expired and missing keys return None.
+
+        :param key:
+        :return:
+        """
+        with self.lock:
+            value, expires_at = self.entries.get(key, (None, 0))
+            return value if expires_at >= time.time() else None
+
+    def set(self, key, value, ttl):
+        """
+        Set value of the key.
+
+        :param key:
+        :param value:
+        :param ttl:
+        :return:
+        """
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+
+    def delete(self, key):
+        """
+        Delete the key.
+
+        :param key:
+        :return:
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        """
+        Delete the keys starting with prefix.
+
+        :param prefix:
+        :return:
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+
+class SQLiteBackend:
+    """Shared backend keeping entries in a SQLite file so every worker process on the host shares them."""
+
+    def __init__(self, path):
+        """
+        Initialize backend and create the entries table.
+
+        :param path: SQLite database file path.
+        """
+        self.path = path
+        with self.connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS page_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)'
+            )
+
+    def connect(self):
+        """
+        Open a connection to the SQLite file.
+
+        :return:
+        """
+        return sqlite3.connect(self.path, timeout=1)
+
+    def get(self, key):
+        """
+        Get value of the key, expired and missing keys return None.
+
+        :param key:
+        :return:
+        """
+        with self.connect() as connection:
+            row = connection.execute(
+                'SELECT value FROM page_cache WHERE key = ? AND expires_at >= ?', (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        """
+        Set value of the key.
+
+        :param key:
+        :param value:
+        :param ttl:
+        :return:
+        """
+        with self.connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO page_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, time.time() + ttl)
+            )
+
+    def delete(self, key):
+        """
+        Delete the key.
+
+        :param key:
+        :return:
+        """
+        with self.connect() as connection:
+            connection.execute('DELETE FROM page_cache WHERE key = ?', (key,))
+
+    def delete_prefix(self, prefix):
+        """
+        Delete the keys starting with prefix.
+
+        :param prefix:
+        :return:
+        """
+        with self.connect() as connection:
+            connection.execute('DELETE FROM page_cache WHERE substr(key, 1, ?) = ?', (len(prefix), prefix))
+
+
+# ==================================================================================================================== #
+# Page Cache.
+# ==================================================================================================================== #
+
+class PageCache:
+    """
+    Read through cache of rendered pages keyed per entity.
+
+    Pages are looked up in the in process LRU first and then in the optional shared backend. Writes invalidate both,
+    other worker processes only drop their local copy once it expires so the local time to live should stay short.
+    Clients that wrote within the local time to live skip the local LRU, so whichever worker serves them they read
+    their own writes. Pages invalidated while they were rendered are not cached, they may hold rows read before the
+    write, nor are pages rendered from a read replica within replica_lag seconds of their invalidation, the replica
+    may not have caught up with the write yet.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, shared_backend=None, shared_ttl=600, replica_lag=0):
+        """
+        Initialize page cache.
+
+        :param max_entries:
+        :param ttl:
+        :param shared_backend:
+        :param shared_ttl:
+        :param replica_lag: seconds.
+        """
+        self.local = LRUCache(max_entries, ttl)
+        self.shared_backend = shared_backend
+        self.shared_ttl = shared_ttl
+        self.replica_lag = replica_lag
+        self.invalidated_at = {}
+        self.invalidated_at_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """
+        Configure page cache from app config.
+
+        :param app:
+        :return:
+        """
+        config = app.config
+        backend = config.get('PAGE_CACHE_BACKEND')
+        if backend == 'memory':
+            self.shared_backend = InMemoryBackend()
+        elif backend and backend.startswith('sqlite:///'):
+            self.shared_backend = SQLiteBackend(backend[len('sqlite:///'):])
+        else:
+            self.shared_backend = None
+
+        self.local = LRUCache(config.get('PAGE_CACHE_MAX_ENTRIES', 1024), config.get('PAGE_CACHE_TTL', 60))
+        self.shared_ttl = config.get('PAGE_CACHE_SHARED_TTL', 600)
+        self.replica_lag = (
+            config.get('DATABASE_REPLICA_STICKY_SECONDS', 0) if config.get('DATABASE_REPLICA_URLS') else 0
+        )
+
+    @staticmethod
+    def key(entity, entity_id):
+        """
+        Cache key of the entity page.
+
+        :param entity:
+        :param entity_id:
+        :return:
+        """
+        return f'{entity}:{entity_id}'
+
+    def count(self, counter):
+        """
+        Increment a hit or miss counter.
+
+        :param counter: attribute name of the counter.
+        :return:
+        """
+        with self.stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key, local=True):
+        """
+        Get cached page of the key.
+
+        :param key:
+        :param local: whether to look the key up in the local LRU.
+        :return:
+        """
+        page = self.local.get(key) if local else None
+        if page is not None:
+            self.count('hits')
+            return page
+
+        if self.shared_backend is not None:
+            page = self.shared_backend.get(key)
+            if page is not None:
+                self.count('shared_hits')
+                self.local.set(key, page)
+                return page
+
+        self.count('misses')
+        return None
+
+    def set(self, key, page):
+        """
+        Cache page of the key.
+
+        :param key:
+        :param page:
+        :return:
+        """
+        self.local.set(key, page)
+        if self.shared_backend is not None:
+            self.shared_backend.set(key, page, self.shared_ttl)
+
+    def drop(self, key):
+        """
+        Drop cached page of the key.
+
+        :param key:
+        :return:
+        """
+        self.local.delete(key)
+        if self.shared_backend is not None:
+            self.shared_backend.delete(key)
+
+    def invalidate(self, entity, *entity_ids):
+        """
+        Drop cached pages of the given entities.
+
+        Invalidations are recorded before pages are dropped, so a render storing its page meanwhile either has it
+        dropped here or drops it itself, see `cached`.
+
+        :param entity:
+        :param entity_ids:
+        :return:
+        """
+        keys = [self.key(entity, entity_id) for entity_id in entity_ids]
+        now = time.monotonic()
+        with self.invalidated_at_lock:
+            self.invalidated_at.update((key, now) for key in keys)
+        for key in keys:
+            self.drop(key)
+
+    def invalidate_all(self, entity):
+        """
+        Drop every cached page of the entity.
+
+        :param entity:
+        :return:
+        """
+        with self.invalidated_at_lock:
+            self.invalidated_at[self.key(entity, '*')] = time.monotonic()
+        prefix = self.key(entity, '')
+        self.local.delete_prefix(prefix)
+        if self.shared_backend is not None:
+            self.shared_backend.delete_prefix(prefix)
+
+    def is_fresh(self, key, started_at):
+        """
+        Whether a page of the key rendered by the current request since started_at reflects the last invalidation.
+
+        :param key:
+        :param started_at: monotonic time the rendering started.
+        :return:
+        """
+        now = time.monotonic()
+        horizon = max(self.replica_lag, MAX_RENDER_SECONDS)
+        if started_at < now - horizon:
+            return False
+
+        since = started_at
+        if self.replica_lag and reads_from_replica():
+            since = min(started_at, now - self.replica_lag)
+        entity = key.partition(':')[0]
+        with self.invalidated_at_lock:
+            for stale_key in [k for k, at in self.invalidated_at.items() if at < now - horizon]:
+                del self.invalidated_at[stale_key]
+            return all(self.invalidated_at.get(k, since - 1) < since for k in (key, self.key(entity, '*')))
+
+    def invalidate_show(self, venue_id, artist_id, start_times=()):
+        """
+        Drop cached pages of the venue and artist shows belong to, along with the calendars listing them.
+
+        :param venue_id:
+        :param artist_id:
+        :param start_times: start times of the created or removed shows.
+        :return:
+        """
+        self.invalidate('venue', venue_id)
+        self.invalidate('artist', artist_id)
+        self.invalidate_calendar([(venue_id, artist_id, start_time) for start_time in start_times])
+
+    def invalidate_calendar(self, shows):
+        """
+        Drop cached calendar pages listing created or removed shows, cities of their venues are fetched by one query.
+
+        :param shows: (venue_id, artist_id, start_time) tuples.
+        :return:
+        """
+        shows = [show for show in shows if show[2] is not None]
+        if not shows:
+            return
+
+        city_ids = dict(
+            db.session.query(Venue.id, Venue.city_id).filter(Venue.id.in_({venue_id for venue_id, _, _ in shows}))
+        )
+        bucket_ids = set()
+        for venue_id, artist_id, start_time in shows:
+            bucket_ids.update(show_bucket_ids(venue_id, artist_id, city_ids.get(venue_id), start_time))
+        self.invalidate('calendar', *bucket_ids)
+
+    def invalidate_venue(self, venue_id):
+        """
+        Drop cached pages of the venue and of the artists playing at it, artist pages list the venue name.
+
+        Calendars of every scope may list the venue name and its own calendars have it as title, all of them are
+        dropped as venues are edited far less often than calendars are read.
+
+        :param venue_id:
+        :return:
+        """
+        self.invalidate('venue', venue_id)
+        artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+        self.invalidate('artist', *[artist_id for artist_id, in artist_ids])
+        self.invalidate_all('calendar')
+
+    def invalidate_artist(self, artist_id):
+        """
+        Drop cached pages of the artist and of the venues it plays at, venue pages list the artist name, along with the
+        calendars, see `invalidate_venue`.
+
+        :param artist_id:
+        :return:
+        """
+        self.invalidate('artist', artist_id)
+        venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+        self.invalidate('venue', *[venue_id for venue_id, in venue_ids])
+        self.invalidate_all('calendar')
+
+    @property
+    def stats(self):
+        """
+        Hit, miss and eviction counters of the cache.
+
+        :return:
+        """
+        with self.stats_lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.local.evictions,
+                'entries': len(self.local.entries),
+            }
+
+    def cached(self, entity, entity_id=None):
+        """
+        Decorator caching the rendered page of a view taking the `<entity>_id` argument.
+
+        Pages are rendered without caching while flash messages are pending, these are part of the page and are only
+        shown once.
+
+        :param entity:
+        :param entity_id: callable computing the entity id from the view arguments instead.
+        :return:
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if session.get('_flashes'):
+                    return view(**kwargs)
+
+                key = self.key(entity, entity_id(**kwargs) if entity_id else kwargs[f'{entity}_id'])
+                page = self.get(key, local=not wrote_within(self.local.ttl))
+                if page is None:
+                    started_at = time.monotonic()
+                    page = view(**kwargs)
+                    if isinstance(page, str) and self.is_fresh(key, started_at):
+                        self.set(key, page)
+                        # An invalidation recorded since the check missed the page, it is stale.
+                        if not self.is_fresh(key, started_at):
+                            self.drop(key)
+                return page
+            return wrapper
+        return decorator
+
+
+# Configured from the app config by `create_app`.
+page_cache = PageCache()
+
@@ -0,0 +1,150 @@
+"""Command line commands for app."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import os
+import sys
+from datetime import date
+import click
+from flask import Blueprint, current_app
+from models import db, Venue, Artist
+from importer import IMPORTERS, DEFAULT_BATCH_SIZE
+import benchmark
+import loadtest
+import assets
+import partitions
+import geo
+from timing import create_profile_token, PROFILE_PARAMETER
+
+
+# Commands are registered on the app along with the blueprint, at the top level of `flask`.
+commands = Blueprint('commands', __name__, cli_group=None)
+
+
+# ==================================================================================================================== #
+# Commands.
+# ==================================================================================================================== #
+
+@commands.cli.command('import')
+@click.argument('entity', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows inserted per statement.')
+@click.option('--reject-file', type=click.File('w'), help='JSON lines file the rejected rows are written to.')
+def import_command(entity, path, batch_size, reject_file):
+    """Import venues, artists or shows from a CSV or JSONL file."""
+    importer = IMPORTERS[entity](batch_size=batch_size, reject_file=reject_file)
+    importer.run(path)
+    click.echo(f'Imported {importer.imported} {entity}, rejected {importer.rejected}.')
+
+
+@commands.cli.command('benchmark')
+@click.option('--database-uri', default=lambda: os.environ.get('BENCHMARK_DATABASE_URI'), required=True,
+              help='Dedicated local database filled with the synthetic catalog, defaults to BENCHMARK_DATABASE_URI.')
+@click.option('--scale', type=click.Choice(sorted(benchmark.SCALES)), default='1k', show_default=True)
+@click.option('--seed', default=0, show_default=True)
+@click.option('--iterations', default=20, show_default=True, help='Requests per route.')
+@click.option('--use-cache', is_flag=True, help='Keep the page cache between requests.')
+@click.option('--baseline', type=click.Path(dir_okay=False), help='Baseline file the run is compared against.')
+@click.option('--write-baseline', is_flag=True, help='Save the run as the baseline instead of comparing.')
+def benchmark_command(database_uri, scale, seed, iterations, use_cache, baseline, write_baseline):
+    """Benchmark every route against a synthetic catalog."""
+    benchmark.prepare_database(database_uri, scale, seed)
+    report = benchmark.run(iterations, use_cache)
+    click.echo(benchmark.format_report(report))
+
+    if baseline and write_baseline:
+        benchmark.save_baseline(baseline, report)
+        click.echo(f'Baseline saved to {baseline}.')
+    elif baseline:
+        regressions = benchmark.compare(report, benchmark.load_baseline(baseline))
+        for regression in regressions:
+            click.echo(f'REGRESSION {regression}', err=True)
+        if regressions:
+            sys.exit(1)
+
+
+@commands.cli.command('load-test')
+@click.option('--database-uri', default=lambda: os.environ.get('BENCHMARK_DATABASE_URI'), required=True,
+              help='Dedicated local database filled with the synthetic catalog, defaults to BENCHMARK_DATABASE_URI.')
+@click.option('--scale', type=click.Choice(sorted(benchmark.SCALES)), default='1k', show_default=True)
+@click.option('--seed', default=0, show_default=True)
+@click.option('--mode', 'modes', type=click.Choice(loadtest.SERVER_MODES), multiple=True,
+              help='Server mode to load, every mode by default.')
+@click.option('--workers', default=2, show_default=True, help='Worker processes per server.')
+@click.option('--concurrency', default=50, show_default=True, help='Concurrent clients.')
+@click.option('--duration', default=10, show_default=True, help='Seconds each mode is loaded.')
+@click.option('--read-delay', default=0.0, show_default=True, help='Seconds clients pause between 1 KiB chunks.')
+def load_test_command(database_uri, scale, seed, modes, workers, concurrency, duration, read_delay):
+    """Load the routes served by gunicorn in each server mode with concurrent clients."""
+    benchmark.prepare_database(database_uri, scale, seed)
+    report = loadtest.run(
+        database_uri, modes or loadtest.SERVER_MODES, workers, concurrency, duration, read_delay
+    )
+    click.echo(loadtest.format_report(report))
+
+
+@commands.cli.command('refresh-show-counters')
+@click.option('--all', 'refresh_all', is_flag=True, help='Recompute counters of every venue and artist.')
+def refresh_show_counters_command(refresh_all):
+    """Roll show counters forward as shows pass into the past, meant to run every minute from cron."""
+    for model in (Venue, Artist):
+        refreshed = model.refresh_show_counters() if refresh_all else model.roll_show_counters_forward()
+        db.session.commit()
+        click.echo(f'Refreshed show counters of {refreshed} {model.__tablename__.lower()}s.')
+
+
+@commands.cli.command('create-show-partitions')
+@click.option('--months-ahead', default=partitions.MONTHS_AHEAD, show_default=True,
+              help='Months ahead of the current one to create partitions for.')
+def create_show_partitions_command(months_ahead):
+    """Create the monthly show partitions ahead of time, meant to run every month from cron."""
+    created = partitions.create_partitions(months_ahead)
+    db.session.commit()
+    click.echo(f'Created {len(created)} show partitions.')
+
+
+@commands.cli.command('archive-shows')
+@click.option('--months', default=partitions.ARCHIVE_AFTER_MONTHS, show_default=True, type=click.IntRange(min=1),
+              help='Months of past shows kept live.')
+def archive_shows_command(months):
+    """Move the shows of months gone by into the show archive, meant to run every month from cron."""
+    before = partitions.add_months(date.today().replace(day=1), -months)
+    archived_partitions, archived_shows = partitions.archive_shows(before)
+    db.session.commit()
+    click.echo(f'Archived {archived_shows} shows before {before} from {len(archived_partitions)} partitions.')
+
+
+@commands.cli.command('geocode')
+@click.option('--lookup', 'lookup_path', default=geo.LOOKUP_PATH, show_default=True,
+              type=click.Path(exists=True, dir_okay=False), help='CSV file of name, state, latitude and longitude.')
+def geocode_command(lookup_path):
+    """Set coordinates of the cities from a local lookup table and place their venues at them."""
+    geocoded, missing = geo.geocode(geo.load_lookup(lookup_path))
+    db.session.commit()
+    click.echo(f'Geocoded {geocoded} cities.')
+    for city in missing:
+        click.echo(f'{city} is missing from the lookup table.', err=True)
+
+
+@commands.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint static files and build the CSS bundles, served from /assets once built."""
+    manifest = assets.build()
+    click.echo(f'Built {len(manifest)} assets into {os.path.join(current_app.static_folder, assets.DIST_DIR)}.')
+
+
+@commands.cli.command('profile-token')
+def profile_token_command():
+    """Print a signed token enabling profiling of the requests it is passed to."""
+    click.echo(f'?{PROFILE_PARAMETER}={create_profile_token()}')
+
+
+@commands.cli.command('benchmark-filters')
+@click.option('--renders', default=10000, show_default=True, help='Formatted values.')
+@click.option('--distinct', default=500, show_default=True, help='Distinct start times among them.')
+def benchmark_filters_command(renders, distinct):
+    """Micro benchmark of the datetime template filter."""
+    for name, duration in benchmark.benchmark_datetime_filter(renders, distinct).items():
+        click.echo(f'{name:<20}{duration:>10.3f} ms')
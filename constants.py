@@ -131,3 +131,13 @@ GENRES = [
     ('Soul', 'Soul'),
     ('Other', 'Other'),
 ]
+
+# Ids of the genres in the Genre lookup table, new genres are appended to GENRES so the ids never change.
+GENRE_IDS = {genre: genre_id for genre_id, (genre, label) in enumerate(GENRES, start=1)}
+GENRE_NAMES = {genre_id: genre for genre, genre_id in GENRE_IDS.items()}
+
+RECURRENCES = [
+    ('once', 'Once'),
+    ('weekly', 'Weekly'),
+    ('monthly', 'Monthly'),
+]
@@ -1,31 +1,130 @@
-from flask import render_template, request, flash, redirect, url_for
+from datetime import date
+from flask import Blueprint, current_app, request, flash, redirect, url_for, jsonify, abort
+from sqlalchemy.exc import SQLAlchemyError
 from models import *
 from forms import *
+import serializers
+import search
+import scheduling
+import show_calendar
+import geo
+from pagination import paginate
+from routing import replica_reads
+from cache import page_cache
+from instrumentation import endpoint_metrics
+from timing import render_template
+from streaming import LazyPage, stream_template
+
+
+main = Blueprint('main', __name__)
+
+# Cache, metrics and pool stats, registered in debug mode or when INTERNAL_ENDPOINTS_ENABLED is set.
+internal = Blueprint('internal', __name__, url_prefix='/_internal')
+
+
+# ==================================================================================================================== #
+# Helpers
+# ==================================================================================================================== #
+
+def search_results(model, values):
+    """
+    Search venues or artists using search term, filters and cursor of the request values.
+
+    :param model:
+    :param values: request form or query arguments.
+    :return: search results, raises ValueError on an unknown state.
+    """
+    seeking = values.get('seeking')
+    return search.search(
+        model,
+        values.get('search_term', ''),
+        genre=values.get('genre') or None,
+        state=values.get('state') or None,
+        seeking={'true': True, 'false': False}.get(seeking.lower()) if seeking else None,
+        cursor=values.get('cursor'),
+        page_size=values.get('page_size')
+    )
+
+
+def artists_page():
+    """
+    Get a page of serialized artists ordered by id using the cursor and genre of the request.
+
+    :return:
+    """
+    query = serializers.query(Artist, 'summary')
+    if request.args.get('genre'):
+        query = query.filter(Genre.criterion(Artist.genres, request.args['genre']))
+    rows, next_cursor, prev_cursor = paginate(
+        query, (Artist.id,), lambda artist: [artist.id], request.args.get('cursor'), request.args.get('page_size')
+    )
+    return serializers.serialize_all(rows, Artist, 'summary'), next_cursor, prev_cursor
+
+
+def shows_page():
+    """
+    Get a page of serialized shows ordered by start time using the cursor of the request.
+
+    :return:
+    """
+    rows, next_cursor, prev_cursor = paginate(
+        serializers.query(Show, 'card'), (Show.start_time, Show.id), lambda show: [show.start_time, show.id],
+        request.args.get('cursor'), request.args.get('page_size')
+    )
+    return serializers.serialize_all(rows, Show, 'card'), next_cursor, prev_cursor
+
+
+# ==================================================================================================================== #
+# Home
+# ==================================================================================================================== #
+
+@main.route('/')
+def index():
+    return render_template('pages/home.html')
+
+
+@main.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+
+@main.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500
 
 
 # ==================================================================================================================== #
 # Venues
 # ==================================================================================================================== #
 
-@app.route('/venues')
+@main.route('/venues')
 def venues():
     """
-    Get list of all venues group by city.
+    Get a page of venues group by city, of a single genre with the genre argument.
 
     :return:
     """
-    cities = City.query.filter(City.venues.any())
-    cities_data = []
-    for city in cities:
-        venues_list = [venue.serialized_data for venue in city.venues]
-        serialized_data = city.serialized_data
-        serialized_data['venues'] = venues_list
-        cities_data.append(serialized_data)
+    cursor, page_size, genre = request.args.get('cursor'), request.args.get('page_size'), request.args.get('genre')
+    return stream_template(
+        'pages/venues.html', page=LazyPage(lambda: Venue.listing_by_city(cursor, page_size, genre)), genre=genre
+    )
 
-    return render_template('pages/venues.html', areas=cities_data)
 
+@main.route('/venues.json')
+def venues_json():
+    """
+    Get json page of venues group by city, of a single genre with the genre argument.
 
-@app.route('/venues/search', methods=['POST'])
+    :return:
+    """
+    areas, next_cursor, prev_cursor = Venue.listing_by_city(
+        request.args.get('cursor'), request.args.get('page_size'), request.args.get('genre')
+    )
+    return jsonify(data=areas, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+@main.route('/venues/search', methods=['POST'])
+@replica_reads
 def search_venues():
     """
     Get list of venue result filtered by search value.
@@ -33,15 +132,65 @@ def search_venues():
     :return:
     """
     search_value = request.form.get('search_term', '')
-    venues_list = [venue.serialized_data for venue in Venue.query.filter(Venue.name.ilike(f'%{search_value}%'))]
-    response = {
-        "count": len(venues_list),
-        "data": venues_list
-    }
+    try:
+        response = search_results(Venue, request.form)
+    except ValueError:
+        abort(400)
     return render_template('pages/search_venues.html', results=response, search_term=search_value)
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/search.json')
+def search_venues_json():
+    """
+    Get json list of venue result filtered by search value.
+
+    :return:
+    """
+    try:
+        return jsonify(search_results(Venue, request.args))
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+
+def near_request_args():
+    """
+    Get location, radius and limit of the nearest venues search from the query arguments.
+
+    :return: (location or None, radius in km, limit).
+    """
+    location = geo.parse_location(request.args.get('latitude'), request.args.get('longitude'))
+    radius_km = geo.bounded(request.args.get('radius'), geo.DEFAULT_RADIUS_KM, geo.MAX_RADIUS_KM)
+    limit = int(geo.bounded(request.args.get('limit'), geo.DEFAULT_LIMIT, geo.MAX_LIMIT))
+    return location, radius_km, limit
+
+
+@main.route('/venues/near')
+def venues_near():
+    """
+    Get venues nearest to the location of the query arguments, a location form without them.
+
+    :return:
+    """
+    location, radius_km, limit = near_request_args()
+    venues_list = geo.nearest_venues(*location, radius_km, limit) if location else None
+    return render_template('pages/venues_near.html', venues=venues_list, location=location, radius=radius_km)
+
+
+@main.route('/venues/near.json')
+def venues_near_json():
+    """
+    Get json list of venues nearest to the location of the query arguments.
+
+    :return:
+    """
+    location, radius_km, limit = near_request_args()
+    if not location:
+        return jsonify(error='latitude and longitude are required.'), 400
+    return jsonify(data=geo.nearest_venues(*location, radius_km, limit), radius_km=radius_km)
+
+
+@main.route('/venues/<int:venue_id>')
+@page_cache.cached('venue')
 def show_venue(venue_id):
     """
     shows the venue page with the given venue_id.
@@ -49,11 +198,13 @@ def show_venue(venue_id):
     :param venue_id:
     :return:
     """
-    venue = Venue.query.filter_by(id=venue_id).first()
-    return render_template('pages/show_venue.html', venue=venue.serialized_data)
+    venue = serializers.query(Venue, 'detail').filter_by(id=venue_id).first()
+    if venue is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=serializers.serialize(venue, 'detail'))
 
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     """
     Create venue from.
@@ -64,7 +215,7 @@ def create_venue_form():
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     """
     Create venue using form data.
@@ -94,8 +245,6 @@ def create_venue_submission():
         except:
             db.session.rollback()
             flash(f'An error occurred. Venue {venue.name} could not be listed.')
-        finally:
-            db.session.close()
 
         return render_template('pages/home.html')
 
@@ -109,7 +258,7 @@ def create_venue_submission():
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     """
     Delete venue by given venue id.
@@ -120,17 +269,21 @@ def delete_venue(venue_id):
     try:
         Venue.query.filter_by(id=venue_id).delete()
         db.session.commit()
-    except:
+    except SQLAlchemyError:
         db.session.rollback()
-    finally:
-        db.session.close()
+        current_app.logger.exception('Venue %s could not be deleted.', venue_id)
+        flash(f'An error occurred. Venue {venue_id} could not be deleted.')
+        return render_template('pages/home.html'), 500
+
+    # Invalidated once committed, so a read in between can not cache the deleted venue again.
+    page_cache.invalidate_venue(venue_id)
 
     # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
     # clicking that button delete it from the db then redirect the user to the homepage
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     """
     Edit venue form.
@@ -138,15 +291,17 @@ def edit_venue(venue_id):
     :param venue_id:
     :return:
     """
-    venue = Venue.query.filter_by(id=venue_id).first()
-    serialized_venue = venue.serialized_data
+    venue = serializers.query(Venue, 'form').filter_by(id=venue_id).first()
+    if venue is None:
+        abort(404)
+    serialized_venue = serializers.serialize(venue, 'form')
     form = VenueForm(obj=venue)
     form.state.process_data(serialized_venue.get('state'))
     form.city.process_data(serialized_venue.get('city'))
     return render_template('forms/edit_venue.html', form=form, venue=serialized_venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     """
     Edit venue using form data.
@@ -155,6 +310,8 @@ def edit_venue_submission(venue_id):
     :return:
     """
     venue = Venue.query.filter_by(id=venue_id).first()
+    if venue is None:
+        abort(404)
     form = VenueForm()
     if form.validate_on_submit():
         city_id = City.get_city_id(form.city.data, form.state.data)
@@ -171,14 +328,13 @@ def edit_venue_submission(venue_id):
 
         try:
             db.session.commit()
+            page_cache.invalidate_venue(venue_id)
             flash(f'Venue {venue.name} was successfully listed!')
         except:
             db.session.rollback()
             flash(f'An error occurred. Venue {venue.name} could not be listed.')
-        finally:
-            db.session.close()
 
-        return redirect(url_for('show_venue', venue_id=venue_id))
+        return redirect(url_for('.show_venue', venue_id=venue_id))
 
     errors = form.errors
 
@@ -194,18 +350,29 @@ def edit_venue_submission(venue_id):
 # Artists
 # ==================================================================================================================== #
 
-@app.route('/artists')
+@main.route('/artists')
 def artists():
     """
-    Return the list of all artists.
+    Return a page of artists, of a single genre with the genre argument.
+
+    :return:
+    """
+    return stream_template('pages/artists.html', page=LazyPage(artists_page), genre=request.args.get('genre'))
+
+
+@main.route('/artists.json')
+def artists_json():
+    """
+    Return json page of artists, of a single genre with the genre argument.
 
     :return:
     """
-    artists_list = [{"id": artist.id, "name": artist.name} for artist in Artist.query.all()]
-    return render_template('pages/artists.html', artists=artists_list)
+    artists_list, next_cursor, prev_cursor = artists_page()
+    return jsonify(data=artists_list, next_cursor=next_cursor, prev_cursor=prev_cursor)
 
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
+@replica_reads
 def search_artists():
     """
     Return the list of artists filtered by name based on search term.
@@ -213,17 +380,28 @@ def search_artists():
     :return:
     """
     search_value = request.form.get('search_term', '')
-    artists_list = [
-        {"id": artist.id, "name": artist.name, "num_upcoming_shows": 0}
-        for artist in Artist.query.filter(Artist.name.ilike(f'%{search_value}%'))]
-    response = {
-        "count": len(artists_list),
-        "data": artists_list
-    }
+    try:
+        response = search_results(Artist, request.form)
+    except ValueError:
+        abort(400)
     return render_template('pages/search_artists.html', results=response, search_term=search_value)
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/search.json')
+def search_artists_json():
+    """
+    Get json list of artist result filtered by search value.
+
+    :return:
+    """
+    try:
+        return jsonify(search_results(Artist, request.args))
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+
+@main.route('/artists/<int:artist_id>')
+@page_cache.cached('artist')
 def show_artist(artist_id):
     """
     Show the artist page by given artist_id.
@@ -231,11 +409,13 @@ def show_artist(artist_id):
     :param artist_id:
     :return:
     """
-    artist = Artist.query.filter_by(id=artist_id).first()
-    return render_template('pages/show_artist.html', artist=artist.serialized_data)
+    artist = serializers.query(Artist, 'detail').filter_by(id=artist_id).first()
+    if artist is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=serializers.serialize(artist, 'detail'))
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     """
     Edit artist form.
@@ -243,15 +423,17 @@ def edit_artist(artist_id):
     :param artist_id:
     :return:
     """
-    artist = Artist.query.filter_by(id=artist_id).first()
-    serialized_artist = artist.serialized_data
+    artist = serializers.query(Artist, 'form').filter_by(id=artist_id).first()
+    if artist is None:
+        abort(404)
+    serialized_artist = serializers.serialize(artist, 'form')
     form = ArtistForm(obj=artist)
     form.state.process_data(serialized_artist.get('state'))
     form.city.process_data(serialized_artist.get('city'))
     return render_template('forms/edit_artist.html', form=form, artist=serialized_artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     """
     Edit artist using from data.
@@ -260,6 +442,8 @@ def edit_artist_submission(artist_id):
     :return:
     """
     artist = Artist.query.filter_by(id=artist_id).first()
+    if artist is None:
+        abort(404)
     form = VenueForm()
     if form.validate_on_submit():
         city_id = City.get_city_id(form.city.data, form.state.data)
@@ -275,14 +459,13 @@ def edit_artist_submission(artist_id):
 
         try:
             db.session.commit()
+            page_cache.invalidate_artist(artist_id)
             flash(f'Artist {artist.name} was successfully listed!')
         except:
             db.session.rollback()
             flash(f'An error occurred. Artist {artist.name} could not be listed.')
-        finally:
-            db.session.close()
 
-        return redirect(url_for('show_artist', artist_id=artist_id))
+        return redirect(url_for('.show_artist', artist_id=artist_id))
 
     errors = form.errors
 
@@ -294,7 +477,7 @@ def edit_artist_submission(artist_id):
     return edit_artist(artist_id)
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     """
     Create artist form.
@@ -305,7 +488,7 @@ def create_artist_form():
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     """
     Save Artist to the data base using form data.
@@ -333,8 +516,6 @@ def create_artist_submission():
         except:
             db.session.rollback()
             flash(f'An error occurred. Artist {artist.name} could not be listed.')
-        finally:
-            db.session.close()
 
         return render_template('pages/home.html')
 
@@ -352,18 +533,28 @@ def create_artist_submission():
 # Shows
 # ==================================================================================================================== #
 
-@app.route('/shows')
+@main.route('/shows')
 def shows():
     """
-    List all shows.
+    List a page of shows.
 
     :return:
     """
-    shows_data = [show.serialized_data for show in Show.query.all()]
-    return render_template('pages/shows.html', shows=shows_data)
+    return stream_template('pages/shows.html', page=LazyPage(shows_page))
 
 
-@app.route('/shows/create')
+@main.route('/shows.json')
+def shows_json():
+    """
+    List json page of shows.
+
+    :return:
+    """
+    shows_data, next_cursor, prev_cursor = shows_page()
+    return jsonify(data=shows_data, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+@main.route('/shows/create')
 def create_shows():
     """
     Create Shows form.
@@ -374,30 +565,37 @@ def create_shows():
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
     """
-    Create new show.
+    Create new show, or a series of recurring shows along with a list of extra start times.
 
     :return:
     """
     form = ShowForm()
     if form.validate_on_submit():
-        show = Show(
-            artist_id=form.artist_id.data,
-            venue_id=form.venue_id.data,
-            start_time=form.start_time.data
-        )
         try:
-            db.session.add(show)
+            start_times = scheduling.occurrences(
+                form.start_time.data, form.recurrence.data, form.interval.data or 1, form.occurrences.data or 1,
+                form.until.data
+            ) + scheduling.parse_start_times(form.start_times.data)
+            scheduled = scheduling.schedule_shows(form.venue_id.data, form.artist_id.data, start_times)
             db.session.commit()
-            flash('Show was successfully listed!')
+        except scheduling.SchedulingError as error:
+            db.session.rollback()
+            for message in error.errors:
+                flash(message)
+            return render_template('forms/new_show.html', form=form)
         except:
             db.session.rollback()
             flash(f'An error occurred. Show could not be listed.')
-        finally:
-            db.session.close()
+            return render_template('pages/home.html')
 
+        page_cache.invalidate_show(int(form.venue_id.data), int(form.artist_id.data), scheduled)
+        if len(scheduled) == 1:
+            flash('Show was successfully listed!')
+        else:
+            flash(f'{len(scheduled)} shows were successfully listed!')
         return render_template('pages/home.html')
 
     flash('Below Errors Occurred while creating Show')
@@ -409,3 +607,117 @@ def create_show_submission():
         flash(f'{key}: f{error}')
 
     return render_template('forms/new_show.html', form=form)
+
+
+# ==================================================================================================================== #
+# Calendar
+# ==================================================================================================================== #
+
+def parse_calendar_day(day):
+    """
+    Parse the day of a calendar URL, unknown days are not found.
+
+    :param day:
+    :return:
+    """
+    try:
+        return show_calendar.parse_day(day)
+    except ValueError:
+        abort(404)
+
+
+def calendar_bucket_id(scope, scope_id, view, day):
+    """
+    Calendar bucket of the view arguments.
+
+    :param scope:
+    :param scope_id:
+    :param view:
+    :param day:
+    :return:
+    """
+    return show_calendar.bucket_id(scope, scope_id, view, parse_calendar_day(day))
+
+
+@main.route('/calendar', defaults={'scope': 'all', 'scope_id': 0})
+@main.route('/<any(cities, venues, artists):scope>/<int:scope_id>/calendar')
+def calendar_today(scope, scope_id):
+    """
+    Redirect to the calendar of the current day, week or month picked by the `view` argument, week by default.
+
+    :param scope:
+    :param scope_id:
+    :return:
+    """
+    view = request.args.get('view')
+    if view not in show_calendar.VIEWS:
+        view = 'week'
+    scope_args = {} if scope == 'all' else {'scope': scope, 'scope_id': scope_id}
+    return redirect(url_for('.calendar', view=view, day=f'{date.today():%Y-%m-%d}', **scope_args))
+
+
+@main.route('/calendar/<any(day, week, month):view>/<day>', defaults={'scope': 'all', 'scope_id': 0})
+@main.route('/<any(cities, venues, artists):scope>/<int:scope_id>/calendar/<any(day, week, month):view>/<day>')
+@page_cache.cached('calendar', calendar_bucket_id)
+def calendar(scope, scope_id, view, day):
+    """
+    Calendar of the shows of the day, week or month holding day, of all shows or of a city, venue or artist.
+
+    Pages are cached per bucket, every day of a week or month shares the page of the bucket.
+
+    :param scope:
+    :param scope_id:
+    :param view:
+    :param day:
+    :return:
+    """
+    calendar_data = show_calendar.get_calendar(scope, scope_id, view, parse_calendar_day(day))
+    if calendar_data is None:
+        abort(404)
+    return render_template('pages/calendar.html', calendar=calendar_data)
+
+
+# ==================================================================================================================== #
+# Internal
+# ==================================================================================================================== #
+
+@internal.route('/cache')
+def page_cache_stats():
+    """
+    Hit, miss and eviction counters of the page cache.
+
+    :return:
+    """
+    return jsonify(page_cache.stats)
+
+
+@internal.route('/metrics')
+def metrics():
+    """
+    Request and SQL metrics aggregated per endpoint.
+
+    :return:
+    """
+    return jsonify(endpoint_metrics.as_dict())
+
+
+@internal.route('/pool')
+def pool_stats():
+    """
+    Connection pool usage of the primary and replica database engines.
+
+    :return:
+    """
+    def usage(engine):
+        pool = engine.pool
+        return {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'max_overflow': current_app.config['DATABASE_MAX_OVERFLOW'],
+            'status': pool.status(),
+        }
+
+    primary = usage(db.get_engine())
+    return jsonify(**primary, replicas=[usage(engine) for engine in db.get_replica_engines()])
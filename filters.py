@@ -1,14 +1,56 @@
 """Filters for app."""
 
+from datetime import date
+from functools import lru_cache
 import dateutil.parser
-import babel
+from babel import Locale
+from babel.dates import LC_TIME, parse_pattern
 
+DATE_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
 
-def format_datetime(value, date_format='medium'):
-    date = dateutil.parser.parse(value)
-    if date_format == 'full':
-        date_format = "EEEE MMMM, d, y 'at' h:mma"
-    elif date_format == 'medium':
-        date_format = "EE MM, dd, y h:mma"
+# Listing pages render the same start times over and over, formatted values are memoized up to this many.
+FORMATTED_CACHE_SIZE = 4096
 
-    return babel.dates.format_datetime(date, date_format)
+
+@lru_cache(maxsize=64)
+def get_pattern(date_format):
+    """
+    Compiled babel pattern of the date format.
+
+    :param date_format: named format of DATE_FORMATS or babel pattern.
+    :return:
+    """
+    return parse_pattern(DATE_FORMATS.get(date_format, date_format))
+
+
+@lru_cache(maxsize=16)
+def get_locale(locale):
+    """
+    Parsed babel locale.
+
+    :param locale:
+    :return:
+    """
+    return Locale.parse(locale)
+
+
+@lru_cache(maxsize=FORMATTED_CACHE_SIZE)
+def format_cached(value, date_format, locale):
+    """
+    Format date, datetime or datetime string, memoized per value, format and locale.
+
+    :param value:
+    :param date_format:
+    :param locale:
+    :return:
+    """
+    if not isinstance(value, date):
+        value = dateutil.parser.parse(value)
+    return get_pattern(date_format).apply(value, get_locale(locale))
+
+
+def format_datetime(value, date_format='medium', locale=LC_TIME):
+    return format_cached(value, date_format, locale)
@@ -1,14 +1,21 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, URL
-from constants import STATES, GENRES
+from wtforms import (
+    StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, TextAreaField
+)
+from wtforms.validators import DataRequired, URL, Optional, NumberRange
+from constants import STATES, GENRES, RECURRENCES
 
 
 class ShowForm(FlaskForm):
     artist_id = StringField('artist_id')
     venue_id = StringField('venue_id')
     start_time = DateTimeField('start_time', validators=[DataRequired()], default=datetime.today())
+    recurrence = SelectField('recurrence', choices=RECURRENCES, default='once')
+    interval = IntegerField('interval', validators=[Optional(), NumberRange(min=1)], default=1)
+    occurrences = IntegerField('occurrences', validators=[Optional(), NumberRange(min=1)], default=1)
+    until = DateTimeField('until', validators=[Optional()])
+    start_times = TextAreaField('start_times')
 
 
 class VenueForm(FlaskForm):
@@ -0,0 +1,214 @@
+"""Offline geocoding of cities and venues, and search of the venues nearest to a location."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import csv
+import math
+import os
+from sqlalchemy import bindparam
+from config import basedir
+from constants import StatesEnum
+from models import db, City, Venue
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Local lookup table of city coordinates, with name, state, latitude and longitude columns.
+LOOKUP_PATH = os.path.join(basedir, 'cities.csv')
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+# ==================================================================================================================== #
+# Geocoding.
+# ==================================================================================================================== #
+
+def load_lookup(path=LOOKUP_PATH):
+    """
+    Load the lookup table of city coordinates.
+
+    :param path:
+    :return: (lower case name, state) -> (latitude, longitude).
+    """
+    with open(path, newline='') as file:
+        return {
+            (row['name'].strip().lower(), row['state'].strip().upper()):
+                (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(file)
+        }
+
+
+def geocode(lookup):
+    """
+    Set the coordinates of the cities without them from the lookup table, then place the venues without coordinates
+    at their city.
+
+    Venues of a city are placed at the city by the database trigger as well when they are created or moved.
+
+    :param lookup: see `load_lookup`.
+    :return: (number of geocoded cities, names of the cities missing from the lookup table).
+    """
+    geocoded, missing = [], []
+    for city_id, name, state in db.session.query(City.id, City.name, City.state).filter(City.latitude.is_(None)):
+        coordinates = lookup.get((name.strip().lower(), state.name if isinstance(state, StatesEnum) else state))
+        if coordinates:
+            geocoded.append({'city_id': city_id, 'latitude': coordinates[0], 'longitude': coordinates[1]})
+        else:
+            missing.append(f'{name}, {state.name if state else ""}')
+
+    if geocoded:
+        db.session.execute(
+            City.__table__.update().where(City.id == bindparam('city_id')).values(
+                latitude=bindparam('latitude'), longitude=bindparam('longitude')
+            ),
+            geocoded
+        )
+    db.session.query(Venue).filter(
+        Venue.latitude.is_(None), Venue.city_id == City.id, City.latitude.isnot(None)
+    ).update({
+        Venue.latitude: City.latitude,
+        Venue.longitude: City.longitude,
+    }, synchronize_session=False)
+    return len(geocoded), missing
+
+
+# ==================================================================================================================== #
+# Nearest Venues.
+# ==================================================================================================================== #
+
+def parse_location(latitude, longitude):
+    """
+    Parse latitude and longitude request values.
+
+    :param latitude:
+    :param longitude:
+    :return: (latitude, longitude), None when either is missing or out of range.
+    """
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        return None
+    return latitude, longitude
+
+
+def bounded(value, default, maximum):
+    """
+    Parse a positive request value bounded by maximum.
+
+    :param value:
+    :param default:
+    :param maximum:
+    :return:
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+
+    return min(value, maximum) if value > 0 else default
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """
+    Great circle distance between two locations by the haversine formula, as a SQL expression.
+
+    :param latitude:
+    :param longitude:
+    :param other_latitude:
+    :param other_longitude:
+    :return:
+    """
+    func = db.func
+    haversine = (
+        func.power(func.sin(func.radians(other_latitude - latitude) / 2), 2)
+        + func.cos(func.radians(latitude)) * func.cos(func.radians(other_latitude))
+        * func.power(func.sin(func.radians(other_longitude - longitude) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(func.least(haversine, 1)))
+
+
+def bounding_boxes(latitude, longitude, radius_km):
+    """
+    Boxes of longitudes and latitudes holding the circle of radius around the location, as SQL expressions.
+
+    A circle crossing the antimeridian gets a box on either side of it, and one reaching a pole spans every longitude.
+
+    :param latitude:
+    :param longitude:
+    :param radius_km:
+    :return:
+    """
+    latitude_delta = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - latitude_delta, -90.0), min(latitude + latitude_delta, 90.0)
+    if south == -90.0 or north == 90.0:
+        spans = [(-180.0, 180.0)]
+    else:
+        # Widest longitude of the circle, on a parallel nearer to the pole than its center.
+        longitude_delta = math.degrees(
+            math.asin(math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)))
+        )
+        west, east = longitude - longitude_delta, longitude + longitude_delta
+        if west < -180.0:
+            spans = [(-180.0, east), (west + 360.0, 180.0)]
+        elif east > 180.0:
+            spans = [(west, 180.0), (-180.0, east - 360.0)]
+        else:
+            spans = [(west, east)]
+
+    return [
+        db.func.box(db.func.point(west, south), db.func.point(east, north))
+        for west, east in spans
+    ]
+
+
+def nearest_venues(latitude, longitude, radius_km=DEFAULT_RADIUS_KM, limit=DEFAULT_LIMIT):
+    """
+    Get the venues nearest to a location within radius, along with their city and upcoming show counter.
+
+    A single query reads the venues of the bounding boxes of the circle through the GiST index on their location, then
+    keeps and orders those within radius by their great circle distance.
+
+    :param latitude:
+    :param longitude:
+    :param radius_km:
+    :param limit:
+    :return:
+    """
+    distance = distance_km(Venue.latitude, Venue.longitude, latitude, longitude)
+    location = db.func.point(Venue.longitude, Venue.latitude)
+    rows = db.session.query(
+        Venue.id, Venue.name, City.name, City.state, Venue.upcoming_shows_count, distance
+    ).join(
+        City, Venue.city_id == City.id
+    ).filter(
+        db.or_(*[location.op('<@')(box) for box in bounding_boxes(latitude, longitude, radius_km)]),
+        distance <= radius_km
+    ).order_by(
+        distance, Venue.id
+    ).limit(limit).all()
+
+    return [
+        {
+            'id': venue_id,
+            'name': name,
+            'city': city_name,
+            'state': city_state.name if city_state else None,
+            'num_upcoming_shows': num_upcoming_shows,
+            'distance_km': round(venue_distance, 2),
+        }
+        for venue_id, name, city_name, city_state, num_upcoming_shows, venue_distance in rows
+    ]
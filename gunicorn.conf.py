@@ -0,0 +1,53 @@
+"""
+Gunicorn settings of app, `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+FYYUR_SERVER_MODE picks how a worker process serves concurrent requests:
+
+* sync: one request at a time per process.
+* threaded: SERVER_THREADS threads per process, as many as the database pool hands out connections by default.
+* async: SERVER_WORKER_CONNECTIONS greenlets per process with gevent, psycopg2 waits on the database cooperatively
+  through psycogreen, so a process keeps serving while requests wait on queries or on slow clients. Requires the
+  gevent and psycogreen packages.
+"""
+
+import multiprocessing
+import os
+from config import env_int, SERVER_MODES
+
+server_mode = os.environ.get('FYYUR_SERVER_MODE', 'threaded')
+if server_mode not in SERVER_MODES:
+    raise ValueError(f"FYYUR_SERVER_MODE must be one of {', '.join(SERVER_MODES)}, not {server_mode}.")
+
+bind = os.environ.get('SERVER_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = env_int('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+timeout = env_int('SERVER_TIMEOUT', 30)
+keepalive = env_int('SERVER_KEEPALIVE', 5)
+# Requests are served by the workers of the process that accepted them, the app is created after the fork so no
+# database connection is shared between processes.
+preload_app = False
+accesslog = os.environ.get('SERVER_ACCESS_LOG')
+
+if server_mode == 'threaded':
+    worker_class = 'gthread'
+    threads = env_int(
+        'SERVER_THREADS', env_int('DATABASE_POOL_SIZE', 5) + env_int('DATABASE_MAX_OVERFLOW', 5)
+    )
+elif server_mode == 'async':
+    worker_class = 'gevent'
+    # Greenlets beyond the database pool wait for a connection, DATABASE_POOL_TIMEOUT should leave them enough time.
+    worker_connections = env_int('SERVER_WORKER_CONNECTIONS', 100)
+else:
+    worker_class = 'sync'
+
+
+def post_fork(server, worker):
+    """
+    Make psycopg2 yield to other greenlets while it waits on the database in async mode.
+
+    :param server:
+    :param worker:
+    :return:
+    """
+    if server_mode == 'async':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
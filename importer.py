@@ -0,0 +1,333 @@
+"""Bulk import of venues, artists and shows from CSV or JSONL files."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import csv
+import json
+from itertools import islice
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from models import db, City, Venue, Artist, Show
+from forms import VenueForm, ArtistForm, ShowForm
+from cache import page_cache
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+DEFAULT_BATCH_SIZE = 1000
+
+LIST_SEPARATOR = ';'
+
+# Boolean columns, CSV values among TRUE_VALUES are true in any case, any other value is false.
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+TRUE_VALUES = ('true', '1', 'yes', 'y')
+
+
+# ==================================================================================================================== #
+# Readers.
+# ==================================================================================================================== #
+
+def read_rows(path):
+    """
+    Stream rows of a CSV or JSONL file as dicts.
+
+    :param path:
+    :return:
+    """
+    with open(path, newline='') as file:
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+def to_form_data(row):
+    """
+    Convert a row into form data, list values of CSV rows are separated by semicolons.
+
+    Boolean fields are checked when true and left out otherwise, as a browser submits a checkbox.
+
+    :param row:
+    :return:
+    """
+    form_data = MultiDict()
+    for key, value in row.items():
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(LIST_SEPARATOR) if genre.strip()]
+        if key in BOOLEAN_FIELDS and not isinstance(value, bool):
+            value = value is not None and str(value).strip().lower() in TRUE_VALUES
+        if isinstance(value, list):
+            form_data.setlist(key, [str(item) for item in value])
+        elif isinstance(value, bool):
+            if value:
+                form_data[key] = 'y'
+        elif value is not None:
+            form_data[key] = str(value)
+    return form_data
+
+
+# ==================================================================================================================== #
+# Importers.
+# ==================================================================================================================== #
+
+class Importer:
+    """
+    Base importer validating rows with the entity form and inserting valid rows in batches.
+
+    Every batch is validated, resolved and inserted by a constant number of statements and committed on its own so
+    memory stays bounded by the batch size. A batch the database refuses is inserted again row by row, so only the
+    failing rows are rejected.
+    """
+    form_class = None
+    model = None
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, reject_file=None):
+        """
+        Initialize importer.
+
+        :param batch_size:
+        :param reject_file: open file the rejected rows are written to as JSON lines.
+        """
+        self.batch_size = batch_size
+        self.reject_file = reject_file
+        self.imported = 0
+        self.rejected = 0
+
+    def reject(self, row, errors):
+        """
+        Record a rejected row.
+
+        :param row: source row as read from the file.
+        :param errors:
+        :return:
+        """
+        self.rejected += 1
+        if self.reject_file is not None:
+            self.reject_file.write(json.dumps({'row': row, 'errors': errors}, default=str) + '\n')
+
+    def validate(self, rows):
+        """
+        Validate rows with the entity form, returns valid forms along with their rows.
+
+        :param rows:
+        :return:
+        """
+        valid = []
+        for row in rows:
+            form = self.form_class(formdata=to_form_data(row), meta={'csrf': False})
+            if form.validate():
+                valid.append((row, form))
+            else:
+                self.reject(row, form.errors)
+        return valid
+
+    def to_values(self, forms):
+        """
+        Column values of the validated forms, rows which can not be inserted are rejected.
+
+        :param forms: validated (row, form) pairs.
+        :return: (row, column values) pairs.
+        """
+        raise NotImplementedError
+
+    def after_insert(self, values):
+        """
+        Hook called after a batch is committed.
+
+        :param values: column values of the inserted rows.
+        :return:
+        """
+
+    def finish(self):
+        """
+        Hook called once every batch is imported.
+
+        :return:
+        """
+
+    def insert(self, values):
+        """
+        Insert rows within a savepoint, so a failure only rolls them back.
+
+        :param values: column values of the rows.
+        :return:
+        """
+        with db.session.begin_nested():
+            db.session.execute(self.model.__table__.insert(), values)
+
+    def import_batch(self, rows):
+        """
+        Validate and insert a batch of rows in a single transaction.
+
+        The batch is inserted by a single statement, when the database refuses it the rows are inserted one by one and
+        those it refuses are rejected.
+
+        :param rows:
+        :return:
+        """
+        pairs = self.to_values(self.validate(rows))
+        if not pairs:
+            db.session.commit()
+            return
+
+        inserted = [values for row, values in pairs]
+        try:
+            self.insert(inserted)
+        except SQLAlchemyError:
+            inserted = []
+            for row, values in pairs:
+                try:
+                    self.insert([values])
+                except SQLAlchemyError as error:
+                    self.reject(row, {'insert': [str(getattr(error, 'orig', error)).strip()]})
+                else:
+                    inserted.append(values)
+
+        try:
+            db.session.commit()
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            for row, values in pairs:
+                self.reject(row, {'batch': [str(getattr(error, 'orig', error)).strip()]})
+            return
+
+        self.imported += len(inserted)
+        if inserted:
+            self.after_insert(inserted)
+
+    def run(self, path):
+        """
+        Import all rows of the file.
+
+        Batches already committed are finished even when a later one fails, the failing batch is rolled back first.
+
+        :param path:
+        :return:
+        """
+        rows = read_rows(path)
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+                db.session.expunge_all()
+        finally:
+            db.session.rollback()
+            self.finish()
+
+
+class EntityImporter(Importer):
+    """Importer of venues and artists resolving the cities of a batch by a single upsert."""
+    columns = ()
+
+    def to_values(self, forms):
+        """
+        Column values of the validated forms along with their resolved city ids.
+
+        :param forms:
+        :return: (row, column values) pairs.
+        """
+        city_ids = City.get_city_ids({(form.city.data, form.state.data) for row, form in forms})
+        values = []
+        for row, form in forms:
+            entity_values = {column: getattr(form, column).data for column in self.columns}
+            entity_values['city_id'] = city_ids[City.cache_key(form.city.data, form.state.data)]
+            values.append((row, entity_values))
+        return values
+
+
+class VenueImporter(EntityImporter):
+    form_class = VenueForm
+    model = Venue
+    columns = (
+        'name', 'address', 'phone', 'website', 'image_link', 'facebook_link', 'seeking_talent',
+        'seeking_description', 'genres',
+    )
+
+
+class ArtistImporter(EntityImporter):
+    form_class = ArtistForm
+    model = Artist
+    columns = (
+        'name', 'phone', 'website', 'image_link', 'facebook_link', 'seeking_venue', 'seeking_description', 'genres',
+    )
+
+
+class ShowImporter(Importer):
+    """Importer of shows refreshing the show counters of the venues and artists they belong to once at the end."""
+    form_class = ShowForm
+    model = Show
+
+    def __init__(self, *args, **kwargs):
+        """Initialize importer."""
+        super().__init__(*args, **kwargs)
+        self.venue_ids = set()
+        self.artist_ids = set()
+
+    def to_values(self, forms):
+        """
+        Column values of the validated forms, shows of unknown venues or artists are rejected.
+
+        :param forms:
+        :return: (row, column values) pairs.
+        """
+        parsed = []
+        for row, form in forms:
+            try:
+                parsed.append((row, int(form.venue_id.data), int(form.artist_id.data), form.start_time.data))
+            except (TypeError, ValueError):
+                self.reject(row, {'id': ['venue_id and artist_id must be integers.']})
+
+        venue_ids = {venue_id for row, venue_id, artist_id, start_time in parsed}
+        artist_ids = {artist_id for row, venue_id, artist_id, start_time in parsed}
+        existing_venue_ids = {venue_id for venue_id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+        existing_artist_ids = {
+            artist_id for artist_id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))
+        }
+
+        values = []
+        for row, venue_id, artist_id, start_time in parsed:
+            if venue_id not in existing_venue_ids or artist_id not in existing_artist_ids:
+                self.reject(row, {'id': ['Venue or artist does not exist.']})
+                continue
+            values.append((row, {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time}))
+        return values
+
+    def after_insert(self, values):
+        """
+        Remember the venues and artists the imported shows belong to and drop cached calendars listing them.
+
+        :param values:
+        :return:
+        """
+        self.venue_ids.update(show['venue_id'] for show in values)
+        self.artist_ids.update(show['artist_id'] for show in values)
+        page_cache.invalidate_calendar([(show['venue_id'], show['artist_id'], show['start_time']) for show in values])
+
+    def finish(self):
+        """
+        Refresh show counters of the venues and artists the imported shows belong to and drop their cached pages.
+
+        :return:
+        """
+        if not self.venue_ids:
+            return
+
+        Show.refresh_counters(self.venue_ids, self.artist_ids)
+        db.session.commit()
+        page_cache.invalidate('venue', *self.venue_ids)
+        page_cache.invalidate('artist', *self.artist_ids)
+
+
+IMPORTERS = {
+    'venues': VenueImporter,
+    'artists': ArtistImporter,
+    'shows': ShowImporter,
+}
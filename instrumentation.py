@@ -0,0 +1,296 @@
+"""Per request SQL instrumentation for app."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import bisect
+import json
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+from models import db
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+SLOWEST_STATEMENTS = 5
+
+# Identical statements repeated with different parameters at least this many times within a request look like an N+1.
+N_PLUS_ONE_THRESHOLD = 5
+
+# Upper bounds in milliseconds of the per endpoint histogram buckets.
+HISTOGRAM_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+# ==================================================================================================================== #
+# Request Stats.
+# ==================================================================================================================== #
+
+class RequestQueries:
+    """SQL statements executed while serving a single request."""
+
+    def __init__(self):
+        """Initialize stats."""
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []
+        self.statements = Counter()
+        self.parameters = defaultdict(set)
+
+    def record(self, statement, duration, parameters=None):
+        """
+        Record an executed statement.
+
+        :param statement:
+        :param duration: seconds.
+        :param parameters: parameters the statement was executed with.
+        :return:
+        """
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+        # Parameters may hold lists and dicts, their representation tells distinct parameter sets apart.
+        self.parameters[statement].add(repr(parameters))
+        self.slowest.append((duration, statement))
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[SLOWEST_STATEMENTS:]
+
+    @property
+    def repeated_statements(self):
+        """
+        Statements repeated with different parameters often enough to look like an N+1, re-reads of the same rows are
+        left out.
+
+        :return:
+        """
+        return {
+            statement: count for statement, count in self.statements.items()
+            if count >= N_PLUS_ONE_THRESHOLD and len(self.parameters[statement]) > 1
+        }
+
+    def as_dict(self):
+        """
+        Serialized stats.
+
+        :return:
+        """
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_time * 1000, 3),
+            'slowest': [
+                {'ms': round(duration * 1000, 3), 'statement': normalize(statement)}
+                for duration, statement in self.slowest
+            ],
+            'n_plus_one': [
+                {'count': count, 'statement': normalize(statement)}
+                for statement, count in self.repeated_statements.items()
+            ],
+        }
+
+
+def normalize(statement):
+    """
+    Collapse whitespace of a statement for logging.
+
+    :param statement:
+    :return:
+    """
+    return re.sub(r'\s+', ' ', statement).strip()
+
+
+# ==================================================================================================================== #
+# Endpoint Metrics.
+# ==================================================================================================================== #
+
+class EndpointMetrics:
+    """Aggregated request and query metrics per endpoint."""
+
+    def __init__(self):
+        """Initialize metrics."""
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(lambda: {
+            'requests': 0,
+            'queries': 0,
+            'query_ms': 0.0,
+            'n_plus_one_requests': 0,
+            'latency_histogram': [0] * (len(HISTOGRAM_BUCKETS) + 1),
+            'queries_histogram': Counter(),
+        })
+
+    def record(self, endpoint, latency, queries):
+        """
+        Record a served request.
+
+        :param endpoint:
+        :param latency: seconds.
+        :param queries: RequestQueries of the request.
+        :return:
+        """
+        with self.lock:
+            metrics = self.endpoints[endpoint]
+            metrics['requests'] += 1
+            metrics['queries'] += queries.count
+            metrics['query_ms'] += queries.total_time * 1000
+            metrics['n_plus_one_requests'] += bool(queries.repeated_statements)
+            metrics['latency_histogram'][bisect.bisect_left(HISTOGRAM_BUCKETS, latency * 1000)] += 1
+            metrics['queries_histogram'][queries.count] += 1
+
+    def as_dict(self):
+        """
+        Serialized metrics.
+
+        :return:
+        """
+        bucket_labels = [f'le_{bucket}ms' for bucket in HISTOGRAM_BUCKETS] + ['inf']
+        with self.lock:
+            return {
+                endpoint: {
+                    'requests': metrics['requests'],
+                    'queries': metrics['queries'],
+                    'query_ms': round(metrics['query_ms'], 3),
+                    'n_plus_one_requests': metrics['n_plus_one_requests'],
+                    'latency_histogram': dict(zip(bucket_labels, metrics['latency_histogram'])),
+                    'queries_histogram': {
+                        str(count): requests for count, requests in sorted(metrics['queries_histogram'].items())
+                    },
+                }
+                for endpoint, metrics in self.endpoints.items()
+            }
+
+
+endpoint_metrics = EndpointMetrics()
+
+# Serializes hooking the engines, concurrent first requests would hook them twice and count every statement twice.
+instrument_lock = threading.Lock()
+
+
+# ==================================================================================================================== #
+# Hooks.
+# ==================================================================================================================== #
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """
+    Remember when the statement started.
+
+    :return:
+    """
+    context._query_started_at = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """
+    Attribute the statement to the current request.
+
+    :return:
+    """
+    if has_request_context() and 'queries' in g:
+        g.queries.record(statement, time.perf_counter() - context._query_started_at, parameters)
+
+
+def instrument_engine(engine):
+    """
+    Hook statement execution events of the engine.
+
+    :param engine:
+    :return:
+    """
+    if event.contains(engine, 'after_cursor_execute', after_cursor_execute):
+        return
+
+    with instrument_lock:
+        if not event.contains(engine, 'after_cursor_execute', after_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def start_request_instrumentation():
+    """
+    Start collecting statements of the request.
+
+    :return:
+    """
+    for engine in [db.get_engine(), *db.get_replica_engines()]:
+        instrument_engine(engine)
+    g.queries = RequestQueries()
+    g.request_started_at = time.perf_counter()
+
+
+def record_request(logger, method, path, endpoint, replica, status, started_at, queries):
+    """
+    Record metrics of a served request and log them.
+
+    :param logger: logger of the app, streamed responses are recorded once the app context is gone.
+    :param method:
+    :param path:
+    :param endpoint:
+    :param replica: whether the request read from a replica.
+    :param status:
+    :param started_at:
+    :param queries: RequestQueries of the request.
+    :return:
+    """
+    latency = time.perf_counter() - started_at
+    endpoint_metrics.record(endpoint, latency, queries)
+
+    stats = queries.as_dict()
+    logger.info(json.dumps({
+        'event': 'request',
+        'method': method,
+        'path': path,
+        'endpoint': endpoint,
+        'replica': replica,
+        'status': status,
+        'ms': round(latency * 1000, 3),
+        'queries': stats['count'],
+        'query_ms': stats['total_ms'],
+        'n_plus_one': len(stats['n_plus_one']),
+    }))
+    for repeated in stats['n_plus_one']:
+        logger.warning(f"Possible N+1 on {endpoint}: {repeated['count']} x {repeated['statement']}")
+    return stats
+
+
+def finish_request_instrumentation(response):
+    """
+    Record metrics of the request, log them and expose them as headers in debug mode.
+
+    Streamed responses run queries while their body is sent, they are recorded once it is closed and carry no headers.
+
+    :param response:
+    :return:
+    """
+    if 'queries' not in g:
+        return response
+
+    args = (
+        current_app.logger, request.method, request.path, request.endpoint or 'unknown',
+        g.get('replica') is not None, response.status_code, g.request_started_at, g.queries
+    )
+    if response.is_streamed:
+        response.call_on_close(lambda: record_request(*args))
+        return response
+
+    stats = record_request(*args)
+    if current_app.debug:
+        response.headers['X-Query-Count'] = str(stats['count'])
+        response.headers['X-Query-Time-Ms'] = str(stats['total_ms'])
+        response.headers['X-Query-N-Plus-One'] = str(len(stats['n_plus_one']))
+
+    return response
+
+
+def init_app(app):
+    """
+    Instrument the requests of app.
+
+    :param app:
+    :return:
+    """
+    app.before_request(start_request_instrumentation)
+    app.after_request(finish_request_instrumentation)
@@ -0,0 +1,236 @@
+"""Load test of app served by gunicorn in each server mode against the benchmark catalog."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import http.client
+import importlib.util
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from config import basedir, SERVER_MODES
+from benchmark import get_routes, percentile
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Packages a server mode needs besides gunicorn.
+MODE_REQUIREMENTS = {
+    'sync': ('gunicorn',),
+    'threaded': ('gunicorn',),
+    'async': ('gunicorn', 'gevent', 'psycogreen'),
+}
+
+SERVER_START_TIMEOUT = 30
+
+# Bytes a slow client reads at once before pausing for the read delay.
+READ_CHUNK_SIZE = 1024
+
+
+# ==================================================================================================================== #
+# Server.
+# ==================================================================================================================== #
+
+def missing_requirements(mode):
+    """
+    Packages of the server mode which are not installed.
+
+    :param mode:
+    :return:
+    """
+    return [package for package in MODE_REQUIREMENTS[mode] if importlib.util.find_spec(package) is None]
+
+
+def free_port():
+    """
+    Pick a free local port.
+
+    :return:
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, database_uri, port, workers):
+    """
+    Start gunicorn serving app in the server mode and wait until it accepts connections.
+
+    :param mode:
+    :param database_uri:
+    :param port:
+    :param workers:
+    :return: server process.
+    """
+    env = dict(
+        os.environ, FYYUR_ENV='production', FYYUR_SERVER_MODE=mode, DATABASE_URL=database_uri,
+        WEB_CONCURRENCY=str(workers), SERVER_BIND=f'127.0.0.1:{port}'
+    )
+    env.setdefault('SECRET_KEY', secrets.token_hex(32))
+    process = subprocess.Popen(
+        [os.path.join(os.path.dirname(sys.executable), 'gunicorn'), '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=basedir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{mode} server exited with status {process.returncode}.')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+
+    stop_server(process)
+    raise RuntimeError(f'{mode} server did not start within {SERVER_START_TIMEOUT} seconds.')
+
+
+def stop_server(process):
+    """
+    Stop server process.
+
+    :param process:
+    :return:
+    """
+    process.terminate()
+    try:
+        process.wait(SERVER_START_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# ==================================================================================================================== #
+# Clients.
+# ==================================================================================================================== #
+
+def fetch(port, url, read_delay):
+    """
+    Request url and read the response, pausing read_delay seconds between chunks like a client on a slow link.
+
+    :param port:
+    :param url:
+    :param read_delay: seconds.
+    :return: (latency in seconds, status).
+    """
+    started_at = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=SERVER_START_TIMEOUT)
+    try:
+        connection.request('GET', url, headers={'Accept-Encoding': 'gzip'})
+        response = connection.getresponse()
+        while response.read(READ_CHUNK_SIZE):
+            if read_delay:
+                time.sleep(read_delay)
+        return time.perf_counter() - started_at, response.status
+    finally:
+        connection.close()
+
+
+def run_clients(port, urls, concurrency, duration, read_delay):
+    """
+    Run concurrent clients requesting the urls in turn for duration seconds.
+
+    :param port:
+    :param urls:
+    :param concurrency: number of clients.
+    :param duration: seconds.
+    :param read_delay: seconds.
+    :return: (latencies of the successful requests, number of failed requests, elapsed seconds).
+    """
+    latencies, errors = [], []
+    started_at = time.perf_counter()
+    deadline = started_at + duration
+
+    def client(offset):
+        index = offset
+        while time.perf_counter() < deadline:
+            url = urls[index % len(urls)]
+            index += 1
+            try:
+                latency, status = fetch(port, url, read_delay)
+            except (OSError, http.client.HTTPException):
+                errors.append(url)
+                continue
+            if status >= 400:
+                errors.append(url)
+            else:
+                latencies.append(latency)
+
+    clients = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return latencies, len(errors), time.perf_counter() - started_at
+
+
+# ==================================================================================================================== #
+# Load Test.
+# ==================================================================================================================== #
+
+def run(database_uri, modes=SERVER_MODES, workers=2, concurrency=50, duration=10, read_delay=0.0):
+    """
+    Serve the GET routes of the benchmark catalog in each server mode and load them with concurrent clients.
+
+    The app must already point at the prepared benchmark database, see `benchmark.prepare_database`.
+
+    :param database_uri:
+    :param modes:
+    :param workers: worker processes per server.
+    :param concurrency: number of clients.
+    :param duration: seconds each mode is loaded.
+    :param read_delay: seconds clients pause between chunks of a response.
+    :return: mode -> throughput and latency percentiles, or the reason the mode was skipped.
+    """
+    urls = [url for name, method, url, data in get_routes() if method == 'GET']
+    report = {}
+    for mode in modes:
+        missing = missing_requirements(mode)
+        if missing:
+            report[mode] = {'skipped': f"{', '.join(missing)} not installed"}
+            continue
+
+        port = free_port()
+        process = start_server(mode, database_uri, port, workers)
+        try:
+            # Warm every worker up so process start and first request setup are not measured.
+            run_clients(port, urls, workers, 1, 0)
+            latencies, errors, elapsed = run_clients(port, urls, concurrency, duration, read_delay)
+        finally:
+            stop_server(process)
+
+        report[mode] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        }
+    return report
+
+
+def format_report(report):
+    """
+    Format load test report as a table.
+
+    :param report:
+    :return:
+    """
+    lines = [f"{'mode':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>12}{'p95 ms':>12}"]
+    for mode, stats in report.items():
+        if 'skipped' in stats:
+            lines.append(f"{mode:<10}  skipped, {stats['skipped']}")
+            continue
+        lines.append(
+            f"{mode:<10}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput']:>10.1f}"
+            f"{stats['p50_ms'] or 0:>12.3f}{stats['p95_ms'] or 0:>12.3f}"
+        )
+    return '\n'.join(lines)
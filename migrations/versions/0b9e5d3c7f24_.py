@@ -0,0 +1,97 @@
+"""normalize venue and artist genres into the genre lookup table
+
+Revision ID: 0b9e5d3c7f24
+Revises: f2b8d4e6a1c7
+Create Date: 2026-10-18 19:37:12.845310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0b9e5d3c7f24'
+down_revision = 'f2b8d4e6a1c7'
+branch_labels = None
+depends_on = None
+
+# Genres of `constants.GENRES` at this revision, their position is their id.
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop', 'Heavy Metal',
+    'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other',
+)
+
+
+def search_vector_function(genres):
+    """
+    Search vector trigger function of venues and artists, see revision 8d3e6b0a2c91.
+
+    :param genres: SQL expression of the genres text of the row.
+    :return:
+    """
+    return f'''
+        CREATE OR REPLACE FUNCTION search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce({genres}, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(
+                    (SELECT name FROM "City" WHERE id = NEW.city_id), ''
+                )), 'C') ||
+                setweight(to_tsvector('simple', coalesce(NEW.seeking_description, '')), 'D');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    '''
+
+
+def upgrade():
+    genre_table = op.create_table('Genre',
+    sa.Column('id', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(genre_table, [{'id': genre_id, 'name': name} for genre_id, name in enumerate(GENRES, start=1)])
+
+    op.execute(search_vector_function(
+        '''(SELECT string_agg(name, ' ' ORDER BY id) FROM "Genre" WHERE id = ANY(NEW.genre_ids))'''
+    ))
+
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('genre_ids', postgresql.ARRAY(sa.SmallInteger()), nullable=True))
+
+        # Genres missing from the lookup table could never be picked by the forms, they become Other.
+        op.execute(f'''
+            UPDATE "{table}" SET genre_ids = ARRAY(
+                SELECT "Genre".id FROM "Genre"
+                WHERE "Genre".name = ANY("{table}".genres) OR (
+                    "Genre".name = 'Other' AND EXISTS (
+                        SELECT 1 FROM unnest("{table}".genres) AS genre
+                        WHERE genre NOT IN (SELECT name FROM "Genre")
+                    )
+                )
+                ORDER BY "Genre".id
+            )
+            WHERE genres IS NOT NULL
+        ''')
+        op.drop_column(table, 'genres')
+        op.create_index(f'ix_{table}_genre_ids', table, ['genre_ids'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table}_genre_ids', table_name=table)
+        op.add_column(table, sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=True))
+        op.execute(f'''
+            UPDATE "{table}" SET genres = ARRAY(
+                SELECT "Genre".name FROM "Genre" WHERE "Genre".id = ANY("{table}".genre_ids) ORDER BY "Genre".id
+            )
+            WHERE genre_ids IS NOT NULL
+        ''')
+
+    op.execute(search_vector_function('NEW.genres::text'))
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'genre_ids')
+    op.drop_table('Genre')
@@ -0,0 +1,63 @@
+"""add indexes for show, city and name search lookups
+
+Revision ID: 5f2a9c1d7e43
+Revises: 0661cddf9ec3
+Create Date: 2026-10-18 10:12:41.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2a9c1d7e43'
+down_revision = '0661cddf9ec3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # Merge duplicated cities before adding the unique index, venues and artists are moved to the oldest city row.
+    op.execute('''
+        UPDATE "Venue" SET city_id = keep.id
+        FROM "City" AS duplicate
+        JOIN (SELECT MIN(id) AS id, name, state FROM "City" GROUP BY name, state) AS keep
+            ON keep.name IS NOT DISTINCT FROM duplicate.name AND keep.state IS NOT DISTINCT FROM duplicate.state
+        WHERE "Venue".city_id = duplicate.id AND duplicate.id <> keep.id
+    ''')
+    op.execute('''
+        UPDATE "Artist" SET city_id = keep.id
+        FROM "City" AS duplicate
+        JOIN (SELECT MIN(id) AS id, name, state FROM "City" GROUP BY name, state) AS keep
+            ON keep.name IS NOT DISTINCT FROM duplicate.name AND keep.state IS NOT DISTINCT FROM duplicate.state
+        WHERE "Artist".city_id = duplicate.id AND duplicate.id <> keep.id
+    ''')
+    op.execute('''
+        DELETE FROM "City" AS duplicate
+        USING "City" AS keep
+        WHERE keep.name IS NOT DISTINCT FROM duplicate.name
+            AND keep.state IS NOT DISTINCT FROM duplicate.state
+            AND keep.id < duplicate.id
+    ''')
+
+    op.create_index('ix_City_name_state', 'City', ['name', 'state'], unique=True)
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    op.create_index(
+        'ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.drop_index('ix_City_name_state', table_name='City')
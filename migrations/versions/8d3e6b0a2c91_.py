@@ -0,0 +1,63 @@
+"""add full text search vectors to venue and artist
+
+Revision ID: 8d3e6b0a2c91
+Revises: 5f2a9c1d7e43
+Create Date: 2026-10-18 11:03:27.519842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3e6b0a2c91'
+down_revision = '5f2a9c1d7e43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.add_column('Artist', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Venue and Artist share the searched column names so a single trigger function serves both tables.
+    op.execute('''
+        CREATE OR REPLACE FUNCTION search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(NEW.genres::text, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(
+                    (SELECT name FROM "City" WHERE id = NEW.city_id), ''
+                )), 'C') ||
+                setweight(to_tsvector('simple', coalesce(NEW.seeking_description, '')), 'D');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    op.execute('''
+        CREATE TRIGGER venue_search_vector_update BEFORE INSERT OR UPDATE ON "Venue"
+        FOR EACH ROW EXECUTE PROCEDURE search_vector_update()
+    ''')
+    op.execute('''
+        CREATE TRIGGER artist_search_vector_update BEFORE INSERT OR UPDATE ON "Artist"
+        FOR EACH ROW EXECUTE PROCEDURE search_vector_update()
+    ''')
+
+    # Touch every row so the trigger backfills existing search vectors.
+    op.execute('UPDATE "Venue" SET name = name')
+    op.execute('UPDATE "Artist" SET name = name')
+
+    op.create_index('ix_Venue_search_vector', 'Venue', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_search_vector', 'Artist', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_search_vector', table_name='Artist')
+    op.drop_index('ix_Venue_search_vector', table_name='Venue')
+    op.execute('DROP TRIGGER IF EXISTS artist_search_vector_update ON "Artist"')
+    op.execute('DROP TRIGGER IF EXISTS venue_search_vector_update ON "Venue"')
+    op.execute('DROP FUNCTION IF EXISTS search_vector_update()')
+    op.drop_column('Artist', 'search_vector')
+    op.drop_column('Venue', 'search_vector')
@@ -0,0 +1,26 @@
+"""add keyset pagination indexes for venue and show listings
+
+Revision ID: a41c7d95e0b8
+Revises: 8d3e6b0a2c91
+Create Date: 2026-10-18 11:48:05.734120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7d95e0b8'
+down_revision = '8d3e6b0a2c91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_city_id_id', 'Venue', ['city_id', 'id'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Venue_city_id_id', table_name='Venue')
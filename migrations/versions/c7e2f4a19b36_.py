@@ -0,0 +1,32 @@
+"""convert artist genres to an array like venue genres
+
+Revision ID: c7e2f4a19b36
+Revises: a41c7d95e0b8
+Create Date: 2026-10-18 13:20:44.081376
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2f4a19b36'
+down_revision = 'a41c7d95e0b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The model declares an array but the initial migration created a string column, rows stored through the ORM hold
+    # array literals while hand written rows hold comma separated values.
+    op.alter_column(
+        'Artist', 'genres', existing_type=sa.String(length=120), type_=sa.ARRAY(sa.String()),
+        postgresql_using="CASE WHEN left(genres, 1) = '{' THEN genres::varchar[] ELSE string_to_array(genres, ',') END"
+    )
+
+
+def downgrade():
+    op.alter_column(
+        'Artist', 'genres', existing_type=sa.ARRAY(sa.String()), type_=sa.String(length=120),
+        postgresql_using="array_to_string(genres, ',')"
+    )
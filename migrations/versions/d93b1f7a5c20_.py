@@ -0,0 +1,50 @@
+"""add show counters and next show time to venues and artists
+
+Revision ID: d93b1f7a5c20
+Revises: c7e2f4a19b36
+Create Date: 2026-10-18 14:05:31.520947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b1f7a5c20'
+down_revision = 'c7e2f4a19b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, foreign_key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(), nullable=True))
+        op.create_index(f'ix_{table}_next_show_time', table, ['next_show_time'], unique=False)
+
+        # Backfill the counters, later on they are maintained by the app and rolled forward by
+        # `flask refresh-show-counters`.
+        op.execute(f'''
+            UPDATE "{table}" SET
+                upcoming_shows_count = (
+                    SELECT count(*) FROM "Show" WHERE "Show".{foreign_key} = "{table}".id
+                    AND "Show".start_time >= localtimestamp
+                ),
+                past_shows_count = (
+                    SELECT count(*) FROM "Show" WHERE "Show".{foreign_key} = "{table}".id
+                    AND ("Show".start_time < localtimestamp OR "Show".start_time IS NULL)
+                ),
+                next_show_time = (
+                    SELECT min("Show".start_time) FROM "Show" WHERE "Show".{foreign_key} = "{table}".id
+                    AND "Show".start_time >= localtimestamp
+                )
+        ''')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table}_next_show_time', table_name=table)
+        op.drop_column(table, 'next_show_time')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,124 @@
+"""partition shows by month of start time and add the show archive
+
+Revision ID: e4a7c2b9f1d3
+Revises: d93b1f7a5c20
+Create Date: 2026-10-18 16:42:08.193574
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2b9f1d3'
+down_revision = 'd93b1f7a5c20'
+branch_labels = None
+depends_on = None
+
+# Monthly partitions created ahead of the current month, later on `flask create-show-partitions` keeps them ahead.
+MONTHS_AHEAD = 12
+
+SHOW_INDEXES = (
+    ('ix_Show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_Show_start_time_id', ['start_time', 'id']),
+)
+
+ARCHIVE_INDEXES = (
+    ('ix_ShowArchive_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_ShowArchive_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_ShowArchive_start_time_id', ['start_time', 'id']),
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.execute('SELECT count(*) FROM "Show" WHERE start_time IS NULL').scalar():
+        raise RuntimeError('Shows are partitioned by start time, set or delete the shows without one first.')
+
+    for name, columns in SHOW_INDEXES:
+        op.drop_index(name, table_name='Show')
+    op.drop_constraint('Show_pkey', 'Show', type_='primary')
+    op.rename_table('Show', 'Show_unpartitioned')
+
+    # The id sequence is handed over to the partitioned table, ids of existing shows are kept.
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute('''
+        CREATE TABLE "Show" (
+            id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+            start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+            venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+            CONSTRAINT "Show_pkey" PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    ''')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    months = conn.execute(f'''
+        SELECT month, month + interval '1 month' FROM (
+            SELECT DISTINCT date_trunc('month', start_time) AS month FROM "Show_unpartitioned"
+            UNION
+            SELECT generate_series(
+                date_trunc('month', localtimestamp),
+                date_trunc('month', localtimestamp) + interval '{MONTHS_AHEAD} months',
+                interval '1 month'
+            )
+        ) AS months
+        ORDER BY month
+    ''').fetchall()
+    for lower, upper in months:
+        op.execute(f'''
+            CREATE TABLE "Show_{lower:%Y_%m}" PARTITION OF "Show"
+            FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')
+        ''')
+
+    for name, columns in SHOW_INDEXES:
+        op.create_index(name, 'Show', columns, unique=False)
+
+    op.execute('''
+        INSERT INTO "Show" (id, start_time, artist_id, venue_id)
+        SELECT id, start_time, artist_id, venue_id FROM "Show_unpartitioned"
+    ''')
+    op.drop_table('Show_unpartitioned')
+
+    # Archived shows are only ever appended in bulk in start time order and read, their index pages are packed full.
+    op.create_table('ShowArchive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    for name, columns in ARCHIVE_INDEXES:
+        op.create_index(name, 'ShowArchive', columns, unique=False, postgresql_with={'fillfactor': 100})
+
+
+def downgrade():
+    op.rename_table('Show', 'Show_partitioned')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.create_table('Show',
+    sa.Column('id', sa.Integer(), server_default=sa.text('nextval(\'"Show_id_seq"\'::regclass)'), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('id', name='Show_pkey_unpartitioned')
+    )
+
+    # Archived shows go back along with the live ones.
+    op.execute('''
+        INSERT INTO "Show" (id, start_time, artist_id, venue_id)
+        SELECT id, start_time, artist_id, venue_id FROM "ShowArchive"
+        UNION ALL
+        SELECT id, start_time, artist_id, venue_id FROM "Show_partitioned"
+    ''')
+    op.drop_table('ShowArchive')
+    op.drop_table('Show_partitioned')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('ALTER TABLE "Show" RENAME CONSTRAINT "Show_pkey_unpartitioned" TO "Show_pkey"')
+    for name, columns in SHOW_INDEXES:
+        op.create_index(name, 'Show', columns, unique=False)
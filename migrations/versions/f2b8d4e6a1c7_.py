@@ -0,0 +1,56 @@
+"""add coordinates to cities and venues
+
+Revision ID: f2b8d4e6a1c7
+Revises: e4a7c2b9f1d3
+Create Date: 2026-10-18 18:20:44.601238
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4e6a1c7'
+down_revision = 'e4a7c2b9f1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('City', 'Venue'):
+        op.add_column(table, sa.Column('latitude', sa.Float(), nullable=True))
+        op.add_column(table, sa.Column('longitude', sa.Float(), nullable=True))
+
+    # Venues are placed at their city when created without coordinates or moved to another city, cities get their
+    # coordinates from `flask geocode`.
+    op.execute('''
+        CREATE OR REPLACE FUNCTION venue_location_update() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.latitude IS NULL OR (
+                TG_OP = 'UPDATE' AND NEW.city_id IS DISTINCT FROM OLD.city_id
+                AND NEW.latitude IS NOT DISTINCT FROM OLD.latitude
+                AND NEW.longitude IS NOT DISTINCT FROM OLD.longitude
+            ) THEN
+                SELECT latitude, longitude INTO NEW.latitude, NEW.longitude FROM "City" WHERE id = NEW.city_id;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    op.execute('''
+        CREATE TRIGGER venue_location_update BEFORE INSERT OR UPDATE OF city_id ON "Venue"
+        FOR EACH ROW EXECUTE PROCEDURE venue_location_update()
+    ''')
+
+    op.create_index(
+        'ix_Venue_location', 'Venue', [sa.text('point(longitude, latitude)')], unique=False, postgresql_using='gist'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_Venue_location', table_name='Venue')
+    op.execute('DROP TRIGGER IF EXISTS venue_location_update ON "Venue"')
+    op.execute('DROP FUNCTION IF EXISTS venue_location_update()')
+    for table in ('Venue', 'City'):
+        op.drop_column(table, 'longitude')
+        op.drop_column(table, 'latitude')
@@ -2,22 +2,81 @@
 # Imports
 # ==================================================================================================================== #
 
+import threading
 from datetime import datetime
-from flask import Flask
+from flask import current_app, has_app_context, has_request_context
 from flask_moment import Moment
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
-from constants import StatesEnum
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.types import TypeDecorator
+from constants import StatesEnum, GENRE_IDS, GENRE_NAMES
+from pagination import paginate
+from routing import RoutingSQLAlchemy
 
 # ==================================================================================================================== #
-# App Config.
+# Extensions.
 # ==================================================================================================================== #
 
-app = Flask(__name__)
-app.config.from_object('config')
-moment = Moment(app)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# Extensions are bound to the app by `create_app`.
+moment = Moment()
+db = RoutingSQLAlchemy()
+migrate = Migrate()
+
+
+@event.listens_for(Engine, 'begin')
+def set_transaction_statement_timeout(conn):
+    """
+    Bound the statements of web requests by the statement timeout and leave those of CLI commands and migrations
+    unbounded.
+
+    Behind an external pooler session settings do not survive, so the timeout of requests is set per transaction.
+    Otherwise connections start with it, see `config.engine_options`, and transactions outside of a request turn it
+    off.
+
+    :param conn:
+    :return:
+    """
+    if not has_app_context():
+        return
+
+    config = current_app.config
+    if not config.get('DATABASE_STATEMENT_TIMEOUT'):
+        return
+
+    if has_request_context():
+        if config.get('DATABASE_EXTERNAL_POOLER'):
+            conn.execute(f"SET LOCAL statement_timeout = {int(config['DATABASE_STATEMENT_TIMEOUT'])}")
+    elif not config.get('DATABASE_EXTERNAL_POOLER'):
+        conn.execute('SET LOCAL statement_timeout = 0')
+
+
+# ==================================================================================================================== #
+# Types.
+# ==================================================================================================================== #
+
+class GenreList(TypeDecorator):
+    """List of genre names stored as an array of the ids of the Genre lookup table."""
+    impl = postgresql.ARRAY(db.SmallInteger)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        unknown = [genre for genre in value if genre not in GENRE_IDS]
+        if unknown:
+            raise ValueError(f"Unknown genres: {', '.join(unknown)}.")
+        return [GENRE_IDS[genre] for genre in value]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return [GENRE_NAMES[genre_id] for genre_id in value]
+
+    def bind_expression(self, bindvalue):
+        # Ids are sent as integer[], which has no operators against smallint[].
+        return db.cast(bindvalue, self.impl)
 
 
 # ==================================================================================================================== #
@@ -32,63 +91,213 @@ class BaseModel(db.Model):
     modified_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
 
+class ShowCountersModel(BaseModel):
+    """
+    Abstract model of venues and artists keeping counters of their shows.
+
+    Counters are refreshed whenever shows are flushed and rolled forward as shows pass into the past by
+    `flask refresh-show-counters`, so pages listing many venues or artists read them without touching shows.
+    """
+    __abstract__ = True
+
+    # Name of the Show foreign key referencing the model.
+    show_foreign_key = None
+
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
+
+    @classmethod
+    def refresh_show_counters(cls, *criterion, now=None):
+        """
+        Recompute show counters of the rows matching criterion.
+
+        Rows are locked before their shows are counted, so the counting statement sees every show committed by a
+        concurrent transaction which refreshed the same rows, and a transaction still inserting shows refreshes them
+        after this one.
+
+        :param criterion:
+        :param now:
+        :return: number of refreshed rows.
+        """
+        now = now or datetime.now()
+        ids = [
+            row_id for row_id, in db.session.query(cls.id).filter(*criterion).order_by(cls.id).with_for_update(
+                key_share=True
+            )
+        ]
+        if not ids:
+            return 0
+
+        foreign_key = getattr(Show, cls.show_foreign_key)
+        upcoming = db.and_(foreign_key == cls.id, Show.start_time >= now)
+        past = db.and_(foreign_key == cls.id, Show.start_time < now)
+        archived = getattr(ShowArchive, cls.show_foreign_key) == cls.id
+        db.session.query(cls).filter(cls.id.in_(ids)).update({
+            cls.upcoming_shows_count: db.select([db.func.count(Show.id)]).where(upcoming).as_scalar(),
+            cls.past_shows_count: (
+                db.select([db.func.count(Show.id)]).where(past).as_scalar()
+                + db.select([db.func.count(ShowArchive.id)]).where(archived).as_scalar()
+            ),
+            cls.next_show_time: db.select([db.func.min(Show.start_time)]).where(upcoming).as_scalar(),
+        }, synchronize_session=False)
+        return len(ids)
+
+    @classmethod
+    def roll_show_counters_forward(cls, now=None):
+        """
+        Refresh counters of the rows whose next show has started since they were last refreshed.
+
+        :param now:
+        :return: number of refreshed rows.
+        """
+        now = now or datetime.now()
+        return cls.refresh_show_counters(cls.next_show_time < now, now=now)
+
+    @property
+    def partitioned_shows(self):
+        """
+        Get upcoming and past shows lists of current venue or artist.
+
+        Archived shows are only read when the past shows counter holds more shows than the live table, that is when
+        some of them were archived.
+
+        :return:
+        """
+        upcoming_shows, past_shows = Show.partitioned(getattr(Show, self.show_foreign_key) == self.id)
+        if len(past_shows) < self.past_shows_count:
+            _, archived_shows = ShowArchive.partitioned(getattr(ShowArchive, self.show_foreign_key) == self.id)
+            past_shows = archived_shows + past_shows
+        return upcoming_shows, past_shows
+
+
+class Genre(db.Model):
+    """Genre lookup table, seeded from `constants.GENRES` by the migrations."""
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name = db.Column(db.String, nullable=False, unique=True)
+
+    @staticmethod
+    def criterion(column, genre):
+        """
+        Criterion matching the rows whose genres column holds genre, answered by the GIN index of the column.
+
+        :param column:
+        :param genre: genre name.
+        :return:
+        """
+        if genre not in GENRE_IDS:
+            return db.false()
+        return column.contains([genre])
+
+    def __repr__(self):
+        """
+        String representation of the Genre model instance.
+
+        :return:
+        """
+        return f'<Genre {self.id} {self.name}>'
+
+
 class City(BaseModel):
     """City Table."""
     __tablename__ = 'City'
+    __table_args__ = (
+        db.Index('ix_City_name_state', 'name', 'state', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     state = db.Column(db.Enum(StatesEnum))
+    # Set by `flask geocode` from the lookup table of city coordinates.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
 
     venues = db.relationship('Venue', backref='city')
     artists = db.relationship('Artist', backref='city')
 
-    @classmethod
-    def get_city_id(cls, city, state):
+    # (name, state) -> id map of committed cities shared by the requests of the process.
+    ids_cache = {}
+    ids_cache_lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(city, state):
         """
-        Get city id by city name and state name.
+        Key of the city in the ids cache.
 
         :param city:
         :param state:
         :return:
         """
-        city_instance = cls.query.filter_by(name=city, state=state).first()
-        if city_instance:
-            return city_instance.id
+        return city, state.name if isinstance(state, StatesEnum) else state
 
-        city_instance = cls(name=city, state=state)
-        try:
-            db.session.add(city_instance)
-            db.session.commit()
-        except:
-            city_instance = None
-            db.session.rollback()
-        finally:
-            city_id = city_instance.id if city_instance else None
+    @classmethod
+    def warm_ids_cache(cls):
+        """
+        Load ids of all cities into the ids cache.
 
-        return city_id
+        :return:
+        """
+        rows = db.session.query(cls.id, cls.name, cls.state).all()
+        with cls.ids_cache_lock:
+            cls.ids_cache.update({cls.cache_key(name, state): city_id for city_id, name, state in rows})
 
-    @property
-    def state_name(self):
+    @classmethod
+    def get_city_id(cls, city, state):
         """
-        Name of the city state.
+        Get city id by city name and state name, the city is created if it does not exist.
 
+        The city is upserted within the transaction of the caller so it is committed or rolled back along with the row
+        referencing it, and concurrent submissions of the same new city resolve to a single row.
+
+        :param city:
+        :param state:
         :return:
         """
-        return self.state.name if self.state else None
+        return cls.get_city_ids([(city, state)])[cls.cache_key(city, state)]
+
+    @classmethod
+    def get_city_ids(cls, cities):
+        """
+        Get ids of many (city name, state name) pairs, missing cities are created.
+
+        Missing cities are upserted by a single multi row statement and their ids fetched by a single query.
+
+        :param cities: iterable of (city name, state name) pairs.
+        :return: (city name, state name) -> id map.
+        """
+        keys = {cls.cache_key(city, state) for city, state in cities}
+        with cls.ids_cache_lock:
+            city_ids = {key: cls.ids_cache[key] for key in keys if key in cls.ids_cache}
+
+        missing = [key for key in keys if key not in city_ids]
+        if not missing:
+            return city_ids
+
+        db.session.execute(
+            postgresql.insert(cls.__table__).values(
+                [{'name': name, 'state': state, 'created_at': db.func.now(), 'modified_at': db.func.now()}
+                 for name, state in missing]
+            ).on_conflict_do_nothing(index_elements=['name', 'state'])
+        )
+        rows = db.session.query(cls.id, cls.name, cls.state).filter(
+            db.tuple_(cls.name, cls.state).in_(missing)
+        ).all()
+
+        resolved = {cls.cache_key(name, state): city_id for city_id, name, state in rows}
+        city_ids.update(resolved)
+        db.session.info.setdefault('pending_city_ids', {}).update(resolved)
+        return city_ids
 
     @property
-    def serialized_data(self):
+    def state_name(self):
         """
-        Serialized data of the city model instance.
+        Name of the city state.
 
         :return:
         """
-        return {
-            'id': self.id,
-            'city': self.name,
-            'state': self.state_name
-        }
+        return self.state.name if self.state else None
 
     def __repr__(self):
         """
@@ -99,8 +308,39 @@ class City(BaseModel):
         return f'<Venue {self.id} {self.name} {self.state_name}>'
 
 
-class Venue(BaseModel):
+@event.listens_for(db.session, 'after_commit')
+def cache_committed_city_ids(session):
+    """
+    Cache ids of the cities resolved by the committed transaction.
+
+    :param session:
+    :return:
+    """
+    pending_city_ids = session.info.pop('pending_city_ids', None)
+    if pending_city_ids:
+        with City.ids_cache_lock:
+            City.ids_cache.update(pending_city_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_rolled_back_city_ids(session):
+    """
+    Discard ids of the cities resolved by the rolled back transaction, these may not exist anymore.
+
+    :param session:
+    :return:
+    """
+    session.info.pop('pending_city_ids', None)
+
+
+class Venue(ShowCountersModel):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Venue_genre_ids', 'genres', postgresql_using='gin'),
+        db.Index('ix_Venue_city_id_id', 'city_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -111,61 +351,60 @@ class Venue(BaseModel):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.BOOLEAN, default=False)
     seeking_description = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String))
+    # Genre names, stored as genre ids.
+    genres = db.Column('genre_ids', GenreList, key='genres')
+    # Maintained by the database trigger from name, genres, city name and seeking description.
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    # Placed at the city by the database trigger unless set otherwise.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
 
     city_id = db.Column(db.Integer, db.ForeignKey('City.id'), nullable=False)
 
     shows = db.relationship('Show', backref='venue')
 
-    @property
-    def upcoming_shows(self):
-        """
-        Get upcoming shows list of current venue.
-
-        :return:
-        """
-        upcoming_shows = Show.query.filter(Show.start_time > datetime.now(), Show.venue_id == self.id).all()
-        return [show.serialized_data for show in upcoming_shows]
-
-    @property
-    def past_shows(self):
-        """
-        Get past shows list of current venue.
+    show_foreign_key = 'venue_id'
 
-        :return:
+    @classmethod
+    def listing_by_city(cls, cursor=None, page_size=None, genre=None):
         """
-        upcoming_shows = Show.query.filter(Show.start_time < datetime.now(), Show.venue_id == self.id).all()
-        return [show.serialized_data for show in upcoming_shows]
+        Get a page of venues grouped by city along with the number of upcoming shows of every venue.
 
-    @property
-    def serialized_data(self):
-        """
-        Serialized data of the venue model instance.
+        Cities, venues and their upcoming show counters are fetched by a single query so the number of queries is
+        constant no matter how many venues are listed. Venues are paginated by keyset on (city_id, id).
 
+        :param cursor:
+        :param page_size:
+        :param genre: only list venues of the genre.
         :return:
         """
-        upcoming_shows = self.upcoming_shows
-        past_shows = self.past_shows
-
-        return {
-            'id': self.id,
-            'name': self.name,
-            'address': self.address,
-            'phone': self.phone,
-            'image_link': self.image_link,
-            'facebook_link': self.facebook_link,
-            'city': self.city.name,
-            'state': self.city.state_name,
-            'genres': self.genres if self.genres else [],
-            'website': self.website,
-            'seeking_description': self.seeking_description,
-            'seeking_talent': self.seeking_talent,
-            'num_upcoming_shows': len(upcoming_shows),
-            'upcoming_shows_count': len(upcoming_shows),
-            'upcoming_shows': upcoming_shows,
-            'past_shows': past_shows,
-            'past_shows_count': len(past_shows),
-        }
+        query = db.session.query(
+            City.id, City.name, City.state, cls.id, cls.name, cls.upcoming_shows_count
+        ).join(
+            City, cls.city_id == City.id
+        )
+        if genre:
+            query = query.filter(Genre.criterion(cls.genres, genre))
+        rows, next_cursor, prev_cursor = paginate(
+            query, (cls.city_id, cls.id), lambda row: [row[0], row[3]], cursor, page_size
+        )
+
+        areas = []
+        for city_id, city_name, city_state, venue_id, venue_name, num_upcoming_shows in rows:
+            if not areas or areas[-1]['id'] != city_id:
+                areas.append({
+                    'id': city_id,
+                    'city': city_name,
+                    'state': city_state.name if city_state else None,
+                    'venues': []
+                })
+            areas[-1]['venues'].append({
+                'id': venue_id,
+                'name': venue_name,
+                'num_upcoming_shows': num_upcoming_shows
+            })
+
+        return areas, next_cursor, prev_cursor
 
     def __repr__(self):
         """
@@ -176,108 +415,178 @@ class Venue(BaseModel):
         return f'<Venue {self.id} {self.name}>'
 
 
-class Artist(BaseModel):
+# Location of the venues as a point of longitude and latitude, searched by `geo.nearest_venues`.
+db.Index('ix_Venue_location', db.func.point(Venue.longitude, Venue.latitude), postgresql_using='gist')
+
+
+class Artist(ShowCountersModel):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Artist_genre_ids', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    # Genre names, stored as genre ids.
+    genres = db.Column('genre_ids', GenreList, key='genres')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.BOOLEAN, default=False)
     seeking_description = db.Column(db.String(500))
+    # Maintained by the database trigger from name, genres, city name and seeking description.
+    search_vector = db.deferred(db.Column(TSVECTOR))
 
     city_id = db.Column(db.Integer, db.ForeignKey('City.id'), nullable=False)
 
     shows = db.relationship('Show', backref='artist')
 
-    @property
-    def upcoming_shows(self):
+    show_foreign_key = 'artist_id'
+
+    def __repr__(self):
         """
-        Get upcoming shows list of current artist.
+        String representation of the Artist model instance.
 
         :return:
         """
-        upcoming_shows = Show.query.filter(Show.start_time > datetime.now(), Show.artist_id == self.id).all()
-        return [show.serialized_data for show in upcoming_shows]
+        return f'<Artist {self.id} {self.name}>'
 
-    @property
-    def past_shows(self):
+
+class ShowRowsMixin:
+    """Mixin of the live and archived show models reading shows along with their venue and artist."""
+
+    @classmethod
+    def partitioned(cls, *criterion):
         """
-        Get past shows list of current artist.
+        Get serialized shows matching criterion partitioned into upcoming and past shows.
 
+        Shows are loaded along with their venue and artist by a single query and partitioned against a single
+        reference time, shows starting at the reference time or later are upcoming.
+
+        :param criterion:
         :return:
         """
-        upcoming_shows = Show.query.filter(Show.start_time < datetime.now(), Show.artist_id == self.id).all()
-        return [show.serialized_data for show in upcoming_shows]
+        rows = db.session.query(
+            cls.id, cls.start_time, cls.venue_id, Venue.name, Venue.image_link, cls.artist_id, Artist.name,
+            Artist.image_link
+        ).join(
+            Venue, cls.venue_id == Venue.id
+        ).join(
+            Artist, cls.artist_id == Artist.id
+        ).filter(
+            *criterion
+        ).order_by(
+            cls.start_time
+        ).all()
+
+        now = datetime.now()
+        upcoming_shows = []
+        past_shows = []
+        for show_id, start_time, venue_id, venue_name, venue_image_link, artist_id, artist_name, artist_image_link \
+                in rows:
+            shows_list = upcoming_shows if start_time >= now else past_shows
+            shows_list.append({
+                'id': show_id,
+                'start_time': start_time,
+                'venue_id': venue_id,
+                'venue_name': venue_name,
+                'venue_image_link': venue_image_link,
+                'artist_id': artist_id,
+                'artist_name': artist_name,
+                'artist_image_link': artist_image_link
+            })
+
+        return upcoming_shows, past_shows
+
+
+class Show(ShowRowsMixin, db.Model):
+    """
+    Show, partitioned by month of its start time.
+
+    Monthly partitions are created ahead of time by `flask create-show-partitions`, shows beyond them land in the
+    default partition until theirs is created. `flask archive-shows` moves old partitions into `ShowArchive`.
+    """
+    __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
 
-    @property
-    def serialized_data(self):
+    # The partition key is part of the primary key of a partitioned table.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    start_time = db.Column(db.DateTime(), primary_key=True)
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+
+    @staticmethod
+    def refresh_counters(venue_ids, artist_ids):
         """
-        Serialized data of the artist model instance.
+        Refresh show counters of the given venues and artists, venues are locked before artists.
 
+        :param venue_ids:
+        :param artist_ids:
         :return:
         """
-        upcoming_shows = self.upcoming_shows
-        past_shows = self.past_shows
-
-        return {
-            'id': self.id,
-            'name': self.name,
-            'phone': self.phone,
-            'image_link': self.image_link,
-            'facebook_link': self.facebook_link,
-            'city': self.city.name,
-            'state': self.city.state_name,
-            'num_upcoming_shows': len(upcoming_shows),
-            'upcoming_shows_count': len(upcoming_shows),
-            'upcoming_shows': upcoming_shows,
-            'past_shows': past_shows,
-            'past_shows_count': len(past_shows),
-        }
+        if venue_ids:
+            Venue.refresh_show_counters(Venue.id.in_(venue_ids))
+        if artist_ids:
+            Artist.refresh_show_counters(Artist.id.in_(artist_ids))
 
     def __repr__(self):
         """
-        String representation of the Artist model instance.
+        String representation of the Show model instance.
 
         :return:
         """
-        return f'<Artist {self.id} {self.name}>'
+        return f'<Show {self.id} {str(self.start_time)}>'
 
 
-class Show(db.Model):
-    __tablename__ = 'Show'
+class ShowArchive(ShowRowsMixin, db.Model):
+    """Past show moved out of the live partitions by `flask archive-shows`, densely packed and read only."""
+    __tablename__ = 'ShowArchive'
+    __table_args__ = (
+        db.Index('ix_ShowArchive_venue_id_start_time', 'venue_id', 'start_time', postgresql_with={'fillfactor': 100}),
+        db.Index('ix_ShowArchive_artist_id_start_time', 'artist_id', 'start_time', postgresql_with={'fillfactor': 100}),
+        db.Index('ix_ShowArchive_start_time_id', 'start_time', 'id', postgresql_with={'fillfactor': 100}),
+    )
 
-    id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime())
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime(), nullable=False)
 
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
 
-    @property
-    def serialized_data(self):
-        """
-        Serialized data of the artist model instance.
-
-        :return:
-        """
-        return {
-            'id': self.id,
-            'start_time': str(self.start_time),
-            'venue_id': self.venue_id,
-            'venue_name': self.venue.name,
-            'venue_image_link': self.venue.image_link,
-            'artist_id': self.artist_id,
-            'artist_name': self.artist.name,
-            'artist_image_link': self.artist.image_link
-        }
-
     def __repr__(self):
         """
-        String representation of the Show model instance.
+        String representation of the ShowArchive model instance.
 
         :return:
         """
-        return f'<Show {self.id} {str(self.start_time)}>'
+        return f'<ShowArchive {self.id} {str(self.start_time)}>'
+
+
+@event.listens_for(db.session, 'after_flush')
+def refresh_flushed_show_counters(session, flush_context):
+    """
+    Refresh show counters of the venues and artists whose shows were created, changed or deleted by the flush.
+
+    :param session:
+    :param flush_context:
+    :return:
+    """
+    venue_ids, artist_ids = set(), set()
+    for instance in [*session.new, *session.dirty, *session.deleted]:
+        if not isinstance(instance, Show):
+            continue
+        attributes = inspect(instance).attrs
+        for attribute, ids in (('venue_id', venue_ids), ('artist_id', artist_ids)):
+            history = attributes[attribute].history
+            ids.update(value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None)
+
+    Show.refresh_counters(venue_ids, artist_ids)
@@ -0,0 +1,130 @@
+"""Keyset pagination helpers for app."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import tuple_, DateTime, Integer, String
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+# ==================================================================================================================== #
+# Helpers.
+# ==================================================================================================================== #
+
+def encode_cursor(values):
+    """
+    Encode keyset values of a row into an opaque url safe cursor.
+
+    :param values:
+    :return:
+    """
+    return base64.urlsafe_b64encode(json.dumps(values, default=datetime.isoformat).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode cursor into keyset values, invalid or empty cursor decodes into None.
+
+    :param cursor:
+    :return:
+    """
+    if not cursor:
+        return None
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        return None
+
+    return values if isinstance(values, list) else None
+
+
+def parse_key_value(key, value):
+    """
+    Parse a decoded cursor value of a keyset column, raises ValueError when it does not fit the column type.
+
+    :param key: keyset column.
+    :param value:
+    :return:
+    """
+    if isinstance(key.type, DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(key.type, Integer) and type(value) is int:
+        return value
+    if isinstance(key.type, String) and isinstance(value, str):
+        return value
+    raise ValueError(f'Invalid cursor value {value!r} of {key}.')
+
+
+def get_page_size(value):
+    """
+    Get page size from request value bounded by the max page size.
+
+    :param value:
+    :return:
+    """
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+
+def paginate(query, keys, row_key, cursor=None, page_size=None):
+    """
+    Get a page of the query rows ordered by the keyset columns along with the next and previous page cursors.
+
+    The keyset columns must be unique together and backed by an index so every page is a single index range scan
+    no matter how deep it is. Cursors which are forged, stale or do not fit the keyset column types start over from
+    the first page.
+
+    :param query:
+    :param keys: keyset columns the rows are ordered by.
+    :param row_key: callable returning the keyset values of a row.
+    :param cursor:
+    :param page_size:
+    :return:
+    """
+    page_size = get_page_size(page_size)
+    keyset = decode_cursor(cursor)
+    backwards = False
+    if keyset and len(keyset) == 2 and keyset[0] in ('next', 'prev') and isinstance(keyset[1], list) \
+            and len(keyset[1]) == len(keys):
+        direction, values = keyset
+        backwards = direction == 'prev'
+        try:
+            values = [parse_key_value(key, value) for key, value in zip(keys, values)]
+        except ValueError:
+            keyset = None
+            backwards = False
+        else:
+            keys_tuple = tuple_(*keys)
+            query = query.filter(keys_tuple < tuple_(*values) if backwards else keys_tuple > tuple_(*values))
+    else:
+        keyset = None
+
+    rows = query.order_by(*[key.desc() for key in keys] if backwards else keys).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    has_next = keyset is not None if backwards else has_more
+    has_prev = has_more if backwards else keyset is not None
+    next_cursor = encode_cursor(['next', row_key(rows[-1])]) if rows and has_next else None
+    prev_cursor = encode_cursor(['prev', row_key(rows[0])]) if rows and has_prev else None
+
+    return rows, next_cursor, prev_cursor
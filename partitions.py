@@ -0,0 +1,165 @@
+"""Monthly partitions of shows, created ahead of time and archived once old."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import re
+from datetime import date
+from models import db, Show, ShowArchive
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Monthly partitions kept ahead of the current month.
+MONTHS_AHEAD = 12
+
+# Months of past shows kept live before they are archived.
+ARCHIVE_AFTER_MONTHS = 24
+
+DEFAULT_PARTITION = f'{Show.__tablename__}_default'
+
+BOUND_PATTERN = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})[^)]*\) TO \('(\d{4}-\d{2}-\d{2})")
+
+COLUMNS = 'id, start_time, artist_id, venue_id'
+
+
+# ==================================================================================================================== #
+# Months.
+# ==================================================================================================================== #
+
+def add_months(month, months):
+    """
+    First day of the month months after the month starting on month.
+
+    :param month: first day of a month.
+    :param months: may be negative.
+    :return:
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """
+    Name of the partition of the month starting on month.
+
+    :param month:
+    :return:
+    """
+    return f'{Show.__tablename__}_{month:%Y_%m}'
+
+
+# ==================================================================================================================== #
+# Partitions.
+# ==================================================================================================================== #
+
+def get_partitions():
+    """
+    Monthly partitions of shows.
+
+    :return: partition name -> (first day, first day after the partition), in order.
+    """
+    rows = db.session.execute('''
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = CAST(:parent AS regclass)
+    ''', {'parent': f'"{Show.__tablename__}"'})
+
+    partitions = {}
+    for name, bound in rows:
+        match = BOUND_PATTERN.search(bound)
+        if match:
+            partitions[name] = tuple(date.fromisoformat(value) for value in match.groups())
+    return dict(sorted(partitions.items(), key=lambda item: item[1]))
+
+
+def create_partition(month):
+    """
+    Create the partition of the month starting on month.
+
+    Shows of the month which landed in the default partition meanwhile are moved into the new partition before it is
+    attached.
+
+    :param month:
+    :return:
+    """
+    name, upper = partition_name(month), add_months(month, 1)
+    db.session.execute(f'CREATE TABLE "{name}" (LIKE "{Show.__tablename__}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    db.session.execute(f'''
+        WITH moved AS (
+            DELETE FROM "{DEFAULT_PARTITION}" WHERE start_time >= :lower AND start_time < :upper
+            RETURNING {COLUMNS}
+        )
+        INSERT INTO "{name}" ({COLUMNS}) SELECT {COLUMNS} FROM moved
+    ''', {'lower': month, 'upper': upper})
+    db.session.execute(
+        f'''ALTER TABLE "{Show.__tablename__}" ATTACH PARTITION "{name}" FOR VALUES FROM ('{month}') TO ('{upper}')'''
+    )
+
+
+def create_partitions(months_ahead=MONTHS_AHEAD, today=None):
+    """
+    Create the missing partitions of the current month, of the months ahead, and of the months having shows in the
+    default partition.
+
+    :param months_ahead:
+    :param today:
+    :return: names of the created partitions.
+    """
+    current_month = (today or date.today()).replace(day=1)
+    months = {add_months(current_month, months) for months in range(months_ahead + 1)}
+    months.update(
+        month.date() for month, in db.session.execute(
+            f'''SELECT DISTINCT date_trunc('month', start_time) FROM "{DEFAULT_PARTITION}"'''
+        )
+    )
+    existing = {lower for lower, upper in get_partitions().values()}
+
+    created = []
+    for month in sorted(months - existing):
+        create_partition(month)
+        created.append(partition_name(month))
+    return created
+
+
+# ==================================================================================================================== #
+# Archive.
+# ==================================================================================================================== #
+
+def archive_shows(before):
+    """
+    Move the shows starting before the month starting on before into the archive.
+
+    Partitions ending by then are detached, copied into the archive in start time order and dropped, old shows of the
+    default partition are moved along. Venues and artists keep their past show counters, see
+    `ShowCountersModel.partitioned_shows`.
+
+    :param before: first day of a month, not after the current month.
+    :return: (names of the archived partitions, number of archived shows).
+    """
+    if before > date.today().replace(day=1):
+        raise ValueError('Only past months are archived.')
+
+    archived_partitions, archived_shows = [], 0
+    for name, (lower, upper) in get_partitions().items():
+        if upper > before:
+            break
+        db.session.execute(f'ALTER TABLE "{Show.__tablename__}" DETACH PARTITION "{name}"')
+        archived_shows += db.session.execute(f'''
+            INSERT INTO "{ShowArchive.__tablename__}" ({COLUMNS})
+            SELECT {COLUMNS} FROM "{name}" ORDER BY start_time, id
+        ''').rowcount
+        db.session.execute(f'DROP TABLE "{name}"')
+        archived_partitions.append(name)
+
+    archived_shows += db.session.execute(f'''
+        WITH moved AS (
+            DELETE FROM "{DEFAULT_PARTITION}" WHERE start_time < :before
+            RETURNING {COLUMNS}
+        )
+        INSERT INTO "{ShowArchive.__tablename__}" ({COLUMNS}) SELECT {COLUMNS} FROM moved ORDER BY start_time, id
+    ''', {'before': before}).rowcount
+    return archived_partitions, archived_shows
@@ -0,0 +1,202 @@
+"""Read replica routing of app database sessions."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import itertools
+import threading
+import time
+from flask import current_app, g, request, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.sql.expression import UpdateBase
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Cookie holding the time of the last write of a client, its requests are served by the primary for a while after it.
+WRITTEN_AT_COOKIE = 'fyyur_written_at'
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+# ==================================================================================================================== #
+# Helpers.
+# ==================================================================================================================== #
+
+def replica_reads(view):
+    """
+    Mark a view served by another method than GET as read only, so it is served from the read replicas as well.
+
+    :param view:
+    :return:
+    """
+    view.replica_reads = True
+    return view
+
+
+def reads_from_replica():
+    """
+    Whether the current request reads from a replica.
+
+    :return:
+    """
+    return has_request_context() and g.get('replica') is not None
+
+
+def wrote_within(seconds):
+    """
+    Whether the client of the current request committed a write within the last seconds.
+
+    :param seconds:
+    :return:
+    """
+    if not has_request_context():
+        return False
+
+    try:
+        written_at = float(request.cookies.get(WRITTEN_AT_COOKIE, 0))
+    except ValueError:
+        written_at = 0
+    return written_at > time.time() - seconds
+
+
+# ==================================================================================================================== #
+# Session.
+# ==================================================================================================================== #
+
+class RoutingSession(SignallingSession):
+    """Session reading from the replica picked for the request, flushes and write statements go to the primary."""
+
+    def get_bind(self, mapper=None, clause=None):
+        """
+        Return the replica engine picked for the request or the primary one.
+
+        :param mapper:
+        :param clause:
+        :return:
+        """
+        replica = g.get('replica') if has_request_context() else None
+        if replica is None or self._flushing or isinstance(clause, UpdateBase):
+            return super().get_bind(mapper, clause)
+        return replica
+
+
+def record_primary_write(session):
+    """
+    Remember the current request committed to the primary, so its client sticks to it for a while.
+
+    :param session:
+    :return:
+    """
+    if has_request_context():
+        g.primary_written_at = time.time()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy extension routing reads of GET requests to read replicas.
+
+    Each GET request, and each view marked with `replica_reads`, reads from one of the DATABASE_REPLICA_URLS picked
+    round robin. Other requests use the primary. A client that committed a write is served by the primary for
+    DATABASE_REPLICA_STICKY_SECONDS, so the page it is redirected to reflects its write even if replicas lag behind.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize extension."""
+        self.replicas = {}
+        self.replicas_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def create_session(self, options):
+        """
+        Create factory of routing sessions.
+
+        :param options:
+        :return:
+        """
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        event.listen(factory, 'after_commit', record_primary_write)
+        return factory
+
+    def init_app(self, app):
+        """
+        Initialize app and register the routing hooks.
+
+        :param app:
+        :return:
+        """
+        app.config.setdefault('DATABASE_REPLICA_URLS', [])
+        app.config.setdefault('DATABASE_REPLICA_STICKY_SECONDS', 5)
+        super().init_app(app)
+        app.before_request(self.route_request)
+        app.after_request(self.stick_to_primary)
+
+    def get_replicas(self, app=None):
+        """
+        Get replica engines of the app along with their round robin iterator, engines are created on first use.
+
+        :param app:
+        :return:
+        """
+        app = self.get_app(app)
+        with self.replicas_lock:
+            if app not in self.replicas:
+                options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+                engines = [create_engine(url, **options) for url in app.config['DATABASE_REPLICA_URLS']]
+                self.replicas[app] = engines, itertools.cycle(engines)
+            return self.replicas[app]
+
+    def get_replica_engines(self, app=None):
+        """
+        Get replica engines of the app.
+
+        :param app:
+        :return:
+        """
+        return self.get_replicas(app)[0]
+
+    def next_replica(self):
+        """
+        Pick the replica engine of the next request.
+
+        :return:
+        """
+        engines, cycle = self.get_replicas()
+        if not engines:
+            return None
+
+        with self.replicas_lock:
+            return next(cycle)
+
+    def route_request(self):
+        """
+        Pick the replica the request reads from, unless it writes or its client recently wrote.
+
+        :return:
+        """
+        g.replica = None
+        view = current_app.view_functions.get(request.endpoint)
+        if request.method not in READ_METHODS and not getattr(view, 'replica_reads', False):
+            return
+
+        if wrote_within(current_app.config['DATABASE_REPLICA_STICKY_SECONDS']):
+            return
+
+        g.replica = self.next_replica()
+
+    def stick_to_primary(self, response):
+        """
+        Remember the time a client wrote, it is sent to the primary for the next few seconds and skips the local page
+        cache of the worker processes for a while, see `cache.PageCache`.
+
+        :param response:
+        :return:
+        """
+        written_at = g.pop('primary_written_at', None)
+        if written_at is not None:
+            response.set_cookie(WRITTEN_AT_COOKIE, str(written_at), httponly=True)
+        return response
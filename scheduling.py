@@ -0,0 +1,190 @@
+"""Scheduling of recurring shows and batches of shows with double booking detection."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import bisect
+from datetime import timedelta
+from itertools import islice
+import dateutil.parser
+from dateutil.rrule import rrule, WEEKLY, MONTHLY
+from models import db, Venue, Artist, Show
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+FREQUENCIES = {
+    'weekly': WEEKLY,
+    'monthly': MONTHLY,
+}
+
+# Upper bound of the shows scheduled at once, two years of weekly shows.
+MAX_OCCURRENCES = 104
+
+# Shows have no end time, shows at the same venue or of the same artist starting less than this apart are double
+# bookings.
+BOOKING_WINDOW = timedelta(hours=3)
+
+
+class SchedulingError(Exception):
+    """Shows could not be scheduled, errors hold the reasons."""
+
+    def __init__(self, errors):
+        """
+        Initialize error.
+
+        :param errors: list of messages.
+        """
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+# ==================================================================================================================== #
+# Occurrences.
+# ==================================================================================================================== #
+
+def occurrences(start_time, recurrence='once', interval=1, count=1, until=None):
+    """
+    Start times of a recurring show, following RRULE semantics: monthly shows skip months without their day.
+
+    :param start_time: start time of the first show.
+    :param recurrence: once, weekly or monthly.
+    :param interval: weeks or months between shows.
+    :param count: number of shows, ignored when until is given.
+    :param until: last possible start time.
+    :return:
+    """
+    if recurrence == 'once':
+        return [start_time]
+
+    rule = rrule(
+        FREQUENCIES[recurrence], dtstart=start_time, interval=interval, until=until, count=None if until else count
+    )
+    # One more than allowed, so schedule_shows reports the series as too long instead of cutting it short.
+    return list(islice(rule, MAX_OCCURRENCES + 1))
+
+
+def parse_start_times(text):
+    """
+    Parse start times listed one per line.
+
+    Start times are local to the venue like those of the form fields, so a time zone or UTC offset is refused rather
+    than compared with the naive booked start times.
+
+    :param text:
+    :return:
+    """
+    start_times = []
+    for line in (text or '').splitlines():
+        if not line.strip():
+            continue
+        try:
+            start_time = dateutil.parser.parse(line)
+        except (ValueError, OverflowError):
+            raise SchedulingError([f'{line.strip()} is not a valid start time.'])
+        if start_time.tzinfo is not None:
+            raise SchedulingError([f'{line.strip()} has a time zone, give start times in the local time of the venue.'])
+        start_times.append(start_time)
+    return start_times
+
+
+# ==================================================================================================================== #
+# Scheduling.
+# ==================================================================================================================== #
+
+def lock_entity(model, entity_id):
+    """
+    Lock the row of a venue or artist until the end of the transaction, so concurrent scheduling of its shows waits.
+
+    Rows are locked the same way show counters lock them, locking them early adds no lock ordering.
+
+    :param model:
+    :param entity_id:
+    :return: whether the row exists.
+    """
+    return db.session.query(model.id).filter(model.id == entity_id).with_for_update(key_share=True).scalar() is not None
+
+
+def find_conflicts(venue_id, artist_id, start_times):
+    """
+    Find existing shows double booking the venue or the artist at the start times.
+
+    Shows around the whole series are fetched by one range query using the (venue_id, start_time) and
+    (artist_id, start_time) indexes, then matched against every start time.
+
+    :param venue_id:
+    :param artist_id:
+    :param start_times: sorted start times.
+    :return: list of messages.
+    """
+    rows = db.session.query(Show.venue_id, Show.artist_id, Show.start_time).filter(
+        db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+        Show.start_time > start_times[0] - BOOKING_WINDOW,
+        Show.start_time < start_times[-1] + BOOKING_WINDOW
+    ).all()
+
+    booked = {
+        'venue': sorted(start_time for show_venue_id, show_artist_id, start_time in rows if show_venue_id == venue_id),
+        'artist': sorted(
+            start_time for show_venue_id, show_artist_id, start_time in rows if show_artist_id == artist_id
+        ),
+    }
+
+    conflicts = []
+    for start_time in start_times:
+        for entity, booked_times in booked.items():
+            index = bisect.bisect_right(booked_times, start_time - BOOKING_WINDOW)
+            if index < len(booked_times) and booked_times[index] < start_time + BOOKING_WINDOW:
+                conflicts.append(
+                    f'The {entity} is already booked for a show at {booked_times[index]:%Y-%m-%d %H:%M}, '
+                    f'too close to {start_time:%Y-%m-%d %H:%M}.'
+                )
+    return conflicts
+
+
+def schedule_shows(venue_id, artist_id, start_times):
+    """
+    Schedule shows of the artist at the venue, all or none of them.
+
+    The venue and artist are checked and locked, the start times are checked against each other and against the
+    booked shows, then every show is inserted by a single multi row statement. The caller commits.
+
+    :param venue_id:
+    :param artist_id:
+    :param start_times:
+    :return: sorted start times of the scheduled shows.
+    """
+    try:
+        venue_id, artist_id = int(venue_id), int(artist_id)
+    except (TypeError, ValueError):
+        raise SchedulingError(['Venue and artist ids must be integers.'])
+
+    start_times = sorted(set(start_times))
+    if not start_times:
+        raise SchedulingError(['No start time was given.'])
+    if len(start_times) > MAX_OCCURRENCES:
+        raise SchedulingError([f'At most {MAX_OCCURRENCES} shows can be scheduled at once.'])
+
+    errors = [
+        f'Shows at {previous:%Y-%m-%d %H:%M} and {start_time:%Y-%m-%d %H:%M} are too close to each other.'
+        for previous, start_time in zip(start_times, start_times[1:]) if start_time - previous < BOOKING_WINDOW
+    ]
+    if not lock_entity(Venue, venue_id):
+        errors.append(f'Venue {venue_id} does not exist.')
+    if not lock_entity(Artist, artist_id):
+        errors.append(f'Artist {artist_id} does not exist.')
+    if errors:
+        raise SchedulingError(errors)
+
+    conflicts = find_conflicts(venue_id, artist_id, start_times)
+    if conflicts:
+        raise SchedulingError(conflicts)
+
+    db.session.execute(Show.__table__.insert().values([
+        {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time} for start_time in start_times
+    ]))
+    Show.refresh_counters({venue_id}, {artist_id})
+    return start_times
@@ -0,0 +1,207 @@
+"""Full text search for venues and artists."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import re
+from constants import GENRE_NAMES, StatesEnum
+from models import db, City, Venue, Artist, Genre
+from pagination import encode_cursor, decode_cursor, get_page_size
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+SEARCH_CONFIG = 'simple'
+
+# Matches counted at most, the exact count of a broad search would read the whole match set once more.
+MAX_COUNT = 1000
+
+SEEKING_COLUMNS = {
+    Venue: Venue.seeking_talent,
+    Artist: Artist.seeking_venue,
+}
+
+
+# ==================================================================================================================== #
+# Helpers.
+# ==================================================================================================================== #
+
+def build_ts_query(search_term):
+    """
+    Build prefix matching text search query from search term so partial words still match.
+
+    :param search_term:
+    :return:
+    """
+    words = re.findall(r'\w+', search_term or '')
+    if not words:
+        return None
+
+    return db.func.to_tsquery(SEARCH_CONFIG, ' & '.join(f'{word}:*' for word in words))
+
+
+def build_name_pattern(search_term):
+    """
+    Build case insensitive LIKE pattern matching the search term anywhere in a name, served by the trigram index.
+
+    :param search_term:
+    :return:
+    """
+    search_term = (search_term or '').strip()
+    if not search_term:
+        return None
+
+    return '%' + re.sub(r'([\\%_])', r'\\\1', search_term) + '%'
+
+
+def filter_criterion(model, ts_query=None, genre=None, state=None, seeking=None, name_pattern=None):
+    """
+    Get filter criterion of the search.
+
+    Names containing the search term match as well as the text search, so parts of words still find names.
+
+    :param model:
+    :param ts_query:
+    :param genre:
+    :param state: state abbreviation.
+    :param seeking:
+    :param name_pattern: see `build_name_pattern`.
+    :return:
+    """
+    if state and state not in StatesEnum.__members__:
+        raise ValueError(f'Unknown state {state}.')
+
+    criterion = []
+    text_criterion = []
+    if ts_query is not None:
+        text_criterion.append(model.search_vector.op('@@')(ts_query))
+    if name_pattern is not None:
+        text_criterion.append(model.name.ilike(name_pattern, escape='\\'))
+    if text_criterion:
+        criterion.append(db.or_(*text_criterion))
+    if genre:
+        criterion.append(Genre.criterion(model.genres, genre))
+    if state:
+        # Not correlated, the state facet joins City itself.
+        cities = db.select([City.id]).where(City.state == StatesEnum[state]).correlate(None)
+        criterion.append(model.city_id.in_(cities))
+    if seeking is not None:
+        criterion.append(SEEKING_COLUMNS[model].is_(seeking))
+    return criterion
+
+
+def get_facets(model, criterion):
+    """
+    Get genre, state and seeking facet counts of the matching rows.
+
+    Counts are aggregated by the database so the match set is never loaded.
+
+    :param model:
+    :param criterion:
+    :return:
+    """
+    genre = db.func.unnest(model.genres).label('genre')
+    genre_subquery = db.session.query(genre).filter(*criterion).subquery()
+    genres = db.session.query(
+        genre_subquery.c.genre, db.func.count()
+    ).group_by(
+        genre_subquery.c.genre
+    ).order_by(
+        db.func.count().desc(), genre_subquery.c.genre
+    ).all()
+
+    states = db.session.query(
+        City.state, db.func.count(model.id)
+    ).join(
+        model, model.city_id == City.id
+    ).filter(
+        *criterion
+    ).group_by(
+        City.state
+    ).order_by(
+        db.func.count(model.id).desc()
+    ).all()
+
+    seeking_column = SEEKING_COLUMNS[model]
+    seeking = db.session.query(
+        seeking_column, db.func.count(model.id)
+    ).filter(
+        *criterion
+    ).group_by(
+        seeking_column
+    ).all()
+
+    return {
+        'genres': [{'value': GENRE_NAMES[value], 'count': count} for value, count in genres],
+        'states': [{'value': value.name, 'count': count} for value, count in states if value],
+        'seeking': [{'value': bool(value), 'count': count} for value, count in seeking],
+    }
+
+
+def count_matches(model, criterion, limit=MAX_COUNT):
+    """
+    Count the matching rows up to limit.
+
+    :param model:
+    :param criterion:
+    :param limit:
+    :return: (count, whether more rows match).
+    """
+    matches = db.session.query(model.id).filter(*criterion).limit(limit + 1).subquery()
+    count = db.session.query(db.func.count()).select_from(matches).scalar()
+    return min(count, limit), count > limit
+
+
+def search(model, search_term, genre=None, state=None, seeking=None, cursor=None, page_size=None):
+    """
+    Search venues or artists ranked by relevance.
+
+    Results are paginated by keyset on (rank, id) so every page costs the same no matter how deep it is. Names matching
+    the search term within a word only rank below text search matches. The count stops at MAX_COUNT, count_capped
+    tells whether more rows match. Unknown states raise ValueError, invalid cursors start over from the first page.
+
+    :param model: Venue or Artist
+    :param search_term:
+    :param genre:
+    :param state:
+    :param seeking:
+    :param cursor:
+    :param page_size:
+    :return:
+    """
+    page_size = get_page_size(page_size)
+    ts_query = build_ts_query(search_term)
+    criterion = filter_criterion(model, ts_query, genre, state, seeking, build_name_pattern(search_term))
+
+    if ts_query is not None:
+        rank = db.func.ts_rank(model.search_vector, ts_query)
+    else:
+        rank = db.cast(0, db.REAL)
+
+    query = db.session.query(model.id, model.name, model.upcoming_shows_count, rank.label('rank')).filter(*criterion)
+
+    keyset = decode_cursor(cursor)
+    if keyset and len(keyset) == 2 and isinstance(keyset[0], (int, float)) and type(keyset[1]) is int:
+        # ts_rank returns a real, the cursor rank is compared as a real too so equal ranks stay equal.
+        last_rank, last_id = db.cast(keyset[0], db.REAL), keyset[1]
+        query = query.filter(db.or_(rank < last_rank, db.and_(rank == last_rank, model.id > last_id)))
+
+    rows = query.order_by(rank.desc(), model.id).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([float(rows[-1].rank), rows[-1].id])
+
+    count, count_capped = count_matches(model, criterion)
+    return {
+        'count': count,
+        'count_capped': count_capped,
+        'data': [
+            {'id': row.id, 'name': row.name, 'num_upcoming_shows': row.upcoming_shows_count} for row in rows
+        ],
+        'facets': get_facets(model, criterion),
+        'next_cursor': next_cursor,
+    }
@@ -0,0 +1,182 @@
+"""Serialization profiles for app models."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+from sqlalchemy.orm import joinedload, load_only
+from models import Venue, Artist, Show
+from timing import timed
+
+
+# ==================================================================================================================== #
+# Profiles.
+# ==================================================================================================================== #
+
+class Profile:
+    """
+    Named serialization profile of a model.
+
+    A profile declares the columns and relationships it needs, these drive the eager loading options of the query so
+    serializing an instance never has to lazy load an attribute which is not part of the profile.
+    """
+
+    def __init__(self, columns, relationships=(), extra_fields=None):
+        """
+        Initialize profile.
+
+        :param columns: names of the model columns copied as is into the serialized data.
+        :param relationships: names of the relationships loaded eagerly along with the instance.
+        :param extra_fields: callable returning additional computed fields of an instance.
+        """
+        self.columns = columns
+        self.relationships = relationships
+        self.extra_fields = extra_fields
+
+    def load_options(self):
+        """
+        Query options loading exactly what the profile needs.
+
+        :return:
+        """
+        options = [load_only(*self.columns)]
+        options.extend(joinedload(relationship) for relationship in self.relationships)
+        return options
+
+    def serialize(self, instance):
+        """
+        Serialize given model instance.
+
+        :param instance:
+        :return:
+        """
+        serialized_data = {column: getattr(instance, column) for column in self.columns}
+        if self.extra_fields:
+            serialized_data.update(self.extra_fields(instance))
+        return serialized_data
+
+
+def _city_fields(instance):
+    """
+    City and state fields of a venue or an artist.
+
+    :param instance:
+    :return:
+    """
+    return {
+        'city': instance.city.name,
+        'state': instance.city.state_name,
+        'genres': instance.genres if instance.genres else [],
+    }
+
+
+def _detail_fields(instance):
+    """
+    City, state and shows fields of a venue or an artist.
+
+    :param instance:
+    :return:
+    """
+    upcoming_shows, past_shows = instance.partitioned_shows
+    serialized_data = _city_fields(instance)
+    serialized_data.update({
+        'num_upcoming_shows': len(upcoming_shows),
+        'upcoming_shows_count': len(upcoming_shows),
+        'upcoming_shows': upcoming_shows,
+        'past_shows': past_shows,
+        'past_shows_count': len(past_shows),
+    })
+    return serialized_data
+
+
+def _show_card_fields(show):
+    """
+    Venue and artist fields of a show.
+
+    :param show:
+    :return:
+    """
+    return {
+        'venue_name': show.venue.name,
+        'venue_image_link': show.venue.image_link,
+        'artist_name': show.artist.name,
+        'artist_image_link': show.artist.image_link,
+    }
+
+
+VENUE_COLUMNS = (
+    'id', 'name', 'address', 'phone', 'image_link', 'facebook_link', 'website', 'seeking_description',
+    'seeking_talent', 'genres', 'city_id',
+)
+ARTIST_COLUMNS = (
+    'id', 'name', 'phone', 'image_link', 'facebook_link', 'website', 'seeking_description', 'seeking_venue',
+    'genres', 'city_id',
+)
+
+PROFILES = {
+    Venue: {
+        'summary': Profile(('id', 'name')),
+        'form': Profile(VENUE_COLUMNS, ('city',), _city_fields),
+        'detail': Profile(VENUE_COLUMNS + ('past_shows_count',), ('city',), _detail_fields),
+    },
+    Artist: {
+        'summary': Profile(('id', 'name')),
+        'form': Profile(ARTIST_COLUMNS, ('city',), _city_fields),
+        'detail': Profile(ARTIST_COLUMNS + ('past_shows_count',), ('city',), _detail_fields),
+    },
+    Show: {
+        'card': Profile(('id', 'start_time', 'venue_id', 'artist_id'), ('venue', 'artist'), _show_card_fields),
+    },
+}
+
+
+# ==================================================================================================================== #
+# Helpers.
+# ==================================================================================================================== #
+
+def get_profile(model, profile_name):
+    """
+    Get serialization profile of the model by name.
+
+    :param model:
+    :param profile_name:
+    :return:
+    """
+    return PROFILES[model][profile_name]
+
+
+def query(model, profile_name):
+    """
+    Query of the model loading only what the given profile needs.
+
+    :param model:
+    :param profile_name:
+    :return:
+    """
+    return model.query.options(*get_profile(model, profile_name).load_options())
+
+
+def serialize(instance, profile_name):
+    """
+    Serialize model instance using the given profile.
+
+    :param instance:
+    :param profile_name:
+    :return:
+    """
+    with timed('serialize'):
+        return get_profile(type(instance), profile_name).serialize(instance)
+
+
+def serialize_all(instances, model, profile_name):
+    """
+    Serialize model instances using the given profile.
+
+    :param instances:
+    :param model:
+    :param profile_name:
+    :return:
+    """
+    profile = get_profile(model, profile_name)
+    with timed('serialize'):
+        return [profile.serialize(instance) for instance in instances]
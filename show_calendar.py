@@ -0,0 +1,209 @@
+"""Calendar of shows per day, week or month, of all shows or of a city, venue or artist."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from models import db, City, Venue, Artist, Show, ShowArchive
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+VIEWS = ('day', 'week', 'month')
+
+# Shows listed by a single calendar page at most.
+MAX_SHOWS = 1000
+
+
+# ==================================================================================================================== #
+# Buckets.
+# ==================================================================================================================== #
+
+def parse_day(value):
+    """
+    Parse a YYYY-MM-DD day.
+
+    :param value:
+    :return:
+    """
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def bucket_start(view, day):
+    """
+    First day of the day, week or month holding day, weeks start on Monday.
+
+    :param view:
+    :param day:
+    :return:
+    """
+    if view == 'week':
+        return day - timedelta(days=day.weekday())
+    if view == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_end(view, start):
+    """
+    First day after the bucket starting at start.
+
+    :param view:
+    :param start:
+    :return:
+    """
+    if view == 'week':
+        return start + timedelta(days=7)
+    if view == 'month':
+        return (start + timedelta(days=31)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def bucket_id(scope, scope_id, view, day):
+    """
+    Id of the calendar bucket holding day, the page cache key of its page.
+
+    :param scope: all, cities, venues or artists, the scope id of all shows is 0.
+    :param scope_id:
+    :param view:
+    :param day:
+    :return:
+    """
+    return f'{scope}-{scope_id}-{view}-{bucket_start(view, day):%Y-%m-%d}'
+
+
+def show_bucket_ids(venue_id, artist_id, city_id, start_time):
+    """
+    Ids of every calendar bucket listing a show.
+
+    :param venue_id:
+    :param artist_id:
+    :param city_id: city of the venue.
+    :param start_time:
+    :return:
+    """
+    day = start_time.date()
+    return {
+        bucket_id(scope, scope_id, view, day)
+        for scope, scope_id in (('all', 0), ('cities', city_id), ('venues', venue_id), ('artists', artist_id))
+        for view in VIEWS
+    }
+
+
+# ==================================================================================================================== #
+# Queries.
+# ==================================================================================================================== #
+
+def get_title(scope, scope_id):
+    """
+    Name of the city, venue or artist of the calendar, None if it does not exist.
+
+    :param scope:
+    :param scope_id:
+    :return:
+    """
+    if scope == 'all':
+        return 'All shows'
+    if scope == 'cities':
+        city = db.session.query(City.name, City.state).filter(City.id == scope_id).first()
+        return city and f'{city.name}, {city.state.name}'
+    model = Venue if scope == 'venues' else Artist
+    return db.session.query(model.name).filter(model.id == scope_id).scalar()
+
+
+def query_rows(model, scope, scope_id, start, end):
+    """
+    Query shows of the calendar starting between start and end, from the live or archived shows.
+
+    :param model: Show or ShowArchive.
+    :param scope:
+    :param scope_id:
+    :param start:
+    :param end:
+    :return:
+    """
+    query = db.session.query(
+        model.id, model.start_time, model.venue_id, Venue.name, model.artist_id, Artist.name, Artist.image_link
+    ).join(
+        Venue, model.venue_id == Venue.id
+    ).join(
+        Artist, model.artist_id == Artist.id
+    ).filter(
+        model.start_time >= start, model.start_time < end
+    )
+    if scope == 'cities':
+        query = query.filter(Venue.city_id == scope_id)
+    elif scope == 'venues':
+        query = query.filter(model.venue_id == scope_id)
+    elif scope == 'artists':
+        query = query.filter(model.artist_id == scope_id)
+    return query.order_by(model.start_time, model.id).limit(MAX_SHOWS + 1)
+
+
+def get_days(scope, scope_id, start, end):
+    """
+    Shows of the calendar starting between start and end, grouped by day.
+
+    Only the time range is read: shows of a venue or artist through their (venue_id, start_time) and
+    (artist_id, start_time) indexes, shows of a city through the venues of the city and then the venue index, all
+    shows through the start time index. Archived shows are read as well for calendars starting in the past.
+
+    :param scope:
+    :param scope_id:
+    :param start: first day.
+    :param end: first day after the calendar.
+    :return: list of (day, shows) pairs and whether shows beyond MAX_SHOWS were left out.
+    """
+    rows = query_rows(Show, scope, scope_id, start, end).all()
+    if start < date.today():
+        # Archived shows all started before the live ones.
+        rows = query_rows(ShowArchive, scope, scope_id, start, end).all() + rows
+    shows = [
+        {
+            'id': show_id,
+            'start_time': start_time,
+            'venue_id': venue_id,
+            'venue_name': venue_name,
+            'artist_id': artist_id,
+            'artist_name': artist_name,
+            'artist_image_link': artist_image_link,
+        }
+        for show_id, start_time, venue_id, venue_name, artist_id, artist_name, artist_image_link in rows[:MAX_SHOWS]
+    ]
+    days = [(day, list(day_shows)) for day, day_shows in groupby(shows, key=lambda show: show['start_time'].date())]
+    return days, len(rows) > MAX_SHOWS
+
+
+def get_calendar(scope, scope_id, view, day):
+    """
+    Calendar of the day, week or month holding day, None if its city, venue or artist does not exist.
+
+    :param scope:
+    :param scope_id:
+    :param view:
+    :param day:
+    :return:
+    """
+    title = get_title(scope, scope_id)
+    if title is None:
+        return None
+
+    start = bucket_start(view, day)
+    end = bucket_end(view, start)
+    days, truncated = get_days(scope, scope_id, start, end)
+    return {
+        'scope': scope,
+        'scope_id': scope_id,
+        'title': title,
+        'view': view,
+        'start': start,
+        'last': end - timedelta(days=1),
+        'previous': bucket_start(view, start - timedelta(days=1)),
+        'next': end,
+        'days': days,
+        'truncated': truncated,
+    }
@@ -0,0 +1,177 @@
+"""Streamed template rendering and response compression for app."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import gzip
+import zlib
+from flask import current_app, request, stream_with_context, get_flashed_messages
+from models import db
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+# Template output is sent in chunks of about this many characters, small enough for the head of the layout to be sent
+# before the rows of the page are queried.
+STREAM_BUFFER_SIZE = 2048
+
+COMPRESSION_LEVEL = 6
+
+# Smaller bodies are sent as is, compressing them saves less than the gzip overhead.
+COMPRESSION_MIN_SIZE = 500
+
+COMPRESSED_MIMETYPES = ('text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript')
+
+
+# ==================================================================================================================== #
+# Streaming.
+# ==================================================================================================================== #
+
+class LazyPage:
+    """
+    Page of rows fetched on first use.
+
+    Passed to a streamed template, everything above the rows is sent before they are queried and the cursors are only
+    read once the rows are rendered. The connection goes back to the pool as soon as the page is fetched, a slow client
+    does not hold it while the rest of the page is sent.
+    """
+
+    def __init__(self, fetch):
+        """
+        Initialize page.
+
+        :param fetch: callable returning (rows, next cursor, previous cursor).
+        """
+        self.fetch = fetch
+        self.result = None
+
+    def load(self):
+        """
+        Fetch the page unless it was already fetched.
+
+        :return:
+        """
+        if self.result is None:
+            self.result = self.fetch()
+            db.session.close()
+        return self.result
+
+    def __iter__(self):
+        return iter(self.load()[0])
+
+    @property
+    def next_cursor(self):
+        return self.load()[1]
+
+    @property
+    def prev_cursor(self):
+        return self.load()[2]
+
+
+def buffered(fragments, size=STREAM_BUFFER_SIZE):
+    """
+    Join rendered fragments into chunks of at least size characters.
+
+    :param fragments:
+    :param size:
+    :return:
+    """
+    buffer, length = [], 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        length += len(fragment)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_template(template_name, **context):
+    """
+    Render template as a stream of chunks sent as soon as they are rendered.
+
+    The request context is kept while streaming so the template can still query the database. Flash messages are
+    popped beforehand, the session is saved before the body is sent.
+
+    :param template_name:
+    :param context:
+    :return:
+    """
+    get_flashed_messages()
+    current_app.update_template_context(context)
+    fragments = current_app.jinja_env.get_template(template_name).generate(**context)
+    return current_app.response_class(stream_with_context(buffered(fragments)), mimetype='text/html')
+
+
+# ==================================================================================================================== #
+# Compression.
+# ==================================================================================================================== #
+
+def gzip_chunks(chunks, charset):
+    """
+    Compress chunks on the fly, every chunk is flushed so it reaches the client right away.
+
+    :param chunks:
+    :param charset:
+    :return:
+    """
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    """
+    Compress textual responses with gzip when the client accepts it, streamed responses are compressed chunk by chunk.
+
+    :param response:
+    :return:
+    """
+    if (
+        response.status_code < 200 or response.status_code >= 300 or response.direct_passthrough
+        or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSED_MIMETYPES
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+
+    if response.is_streamed:
+        response.response = gzip_chunks(response.response, response.charset)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(gzip.compress(data, COMPRESSION_LEVEL))
+
+    # The compressed body is another representation of the same resource, its entity tag only holds weakly.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_app(app):
+    """
+    Compress the responses of app.
+
+    :param app:
+    :return:
+    """
+    app.after_request(compress_response)
@@ -0,0 +1,260 @@
+"""Per phase request timing and on demand profiling for app."""
+
+# ==================================================================================================================== #
+# Imports
+# ==================================================================================================================== #
+
+import cProfile
+import heapq
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import current_app, g, request, has_request_context, render_template as flask_render_template
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+
+# ==================================================================================================================== #
+# Constants.
+# ==================================================================================================================== #
+
+STARTED_AT_KEY = 'fyyur.started_at'
+
+PROFILE_PARAMETER = '_profile'
+
+PROFILE_TOKEN_SALT = 'profile'
+
+
+# ==================================================================================================================== #
+# Phases.
+# ==================================================================================================================== #
+
+class TimingMiddleware:
+    """WSGI middleware recording when the request reached the app, before routing and request context set up."""
+
+    def __init__(self, wsgi_app):
+        """
+        Initialize middleware.
+
+        :param wsgi_app:
+        """
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        environ[STARTED_AT_KEY] = time.perf_counter()
+        return self.wsgi_app(environ, start_response)
+
+
+def query_time():
+    """
+    Seconds spent on SQL statements by the current request so far.
+
+    :return:
+    """
+    return g.queries.total_time if 'queries' in g else 0.0
+
+
+@contextmanager
+def timed(phase):
+    """
+    Add time spent in the block to the phase of the current request, SQL time of the block is left to the db phase.
+
+    :param phase:
+    :return:
+    """
+    if not has_request_context() or 'phases' not in g:
+        yield
+        return
+
+    started_at = time.perf_counter()
+    query_time_before = query_time()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started_at - (query_time() - query_time_before)
+        g.phases[phase] += elapsed
+
+
+def render_template(template_name_or_list, **context):
+    """
+    Render template timing it as the render phase.
+
+    :param template_name_or_list:
+    :param context:
+    :return:
+    """
+    with timed('render'):
+        return flask_render_template(template_name_or_list, **context)
+
+
+def server_timing(phases):
+    """
+    Format phases in milliseconds as Server-Timing header value.
+
+    :param phases:
+    :return:
+    """
+    return ', '.join(f'{phase};dur={duration * 1000:.3f}' for phase, duration in phases.items())
+
+
+# ==================================================================================================================== #
+# Profiling.
+# ==================================================================================================================== #
+
+class SlowestProfiles:
+    """Keep profiling stats files of the slowest requests only."""
+
+    def __init__(self, directory, keep):
+        """
+        Initialize store.
+
+        :param directory:
+        :param keep: number of stats files kept.
+        """
+        self.directory = directory
+        self.keep = keep
+        self.heap = []
+        self.lock = threading.Lock()
+
+    def add(self, profiler, duration, endpoint):
+        """
+        Dump stats of the profiled request if it is among the slowest ones.
+
+        :param profiler:
+        :param duration: seconds.
+        :param endpoint:
+        :return:
+        """
+        with self.lock:
+            if len(self.heap) >= self.keep and duration <= self.heap[0][0]:
+                return
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{int(duration * 1000)}ms-{endpoint}-{time.time_ns()}.prof')
+            profiler.dump_stats(path)
+            heapq.heappush(self.heap, (duration, path))
+            if len(self.heap) > self.keep:
+                faster_duration, faster_path = heapq.heappop(self.heap)
+                if os.path.exists(faster_path):
+                    os.remove(faster_path)
+
+
+def profile_token_serializer():
+    """
+    Serializer signing profiling tokens with the app secret key.
+
+    :return:
+    """
+    return URLSafeTimedSerializer(current_app.secret_key, salt=PROFILE_TOKEN_SALT)
+
+
+def create_profile_token():
+    """
+    Create signed token enabling profiling of the requests it is passed to.
+
+    :return:
+    """
+    return profile_token_serializer().dumps('profile')
+
+
+def should_profile():
+    """
+    Whether the current request is profiled, either it carries a valid signed token or it is randomly sampled.
+
+    :return:
+    """
+    token = request.args.get(PROFILE_PARAMETER)
+    if token:
+        try:
+            profile_token_serializer().loads(token, max_age=current_app.config.get('PROFILE_TOKEN_MAX_AGE', 3600))
+            return True
+        except BadSignature:
+            return False
+
+    sample_rate = current_app.config.get('PROFILE_SAMPLE_RATE', 0)
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+# ==================================================================================================================== #
+# Hooks.
+# ==================================================================================================================== #
+
+def start_request_timing():
+    """
+    Start timing phases of the request and start profiling it when asked for.
+
+    :return:
+    """
+    now = time.perf_counter()
+    g.phases = defaultdict(float)
+    g.phases['routing'] = now - request.environ.get(STARTED_AT_KEY, now)
+    if should_profile():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def keep_profile(slowest_profiles, profiler, started_at, endpoint):
+    """
+    Stop profiling a request and keep its profile if it is among the slowest.
+
+    :param slowest_profiles: SlowestProfiles of the app, streamed responses are closed once the app context is gone.
+    :param profiler:
+    :param started_at:
+    :param endpoint:
+    :return:
+    """
+    profiler.disable()
+    slowest_profiles.add(profiler, time.perf_counter() - started_at, endpoint)
+
+
+def finish_request_timing(response):
+    """
+    Emit Server-Timing header of the request phases and keep its profile if it was profiled.
+
+    Streamed responses run queries and render while their body is sent, they carry no header and their profile is
+    kept once the body is closed.
+
+    :param response:
+    :return:
+    """
+    if 'phases' not in g:
+        return response
+
+    now = time.perf_counter()
+    started_at = request.environ.get(STARTED_AT_KEY, now)
+    profiler = g.pop('profiler', None)
+    profile_args = (current_app.extensions['slowest_profiles'], profiler, started_at, request.endpoint or 'unknown')
+
+    if response.is_streamed:
+        if profiler is not None:
+            response.call_on_close(lambda: keep_profile(*profile_args))
+        return response
+
+    total = now - started_at
+    phases = dict(g.phases)
+    phases['db'] = query_time()
+    phases['view'] = max(0.0, total - sum(phases.values()))
+    phases['total'] = total
+    response.headers['Server-Timing'] = server_timing(phases)
+
+    if profiler is not None:
+        keep_profile(*profile_args)
+
+    return response
+
+
+def init_app(app):
+    """
+    Time the requests of app and keep the profiles of the slowest ones.
+
+    :param app:
+    :return:
+    """
+    app.wsgi_app = TimingMiddleware(app.wsgi_app)
+    app.extensions['slowest_profiles'] = SlowestProfiles(
+        app.config.get('PROFILE_DIR', 'profiles'), app.config.get('PROFILE_KEEP', 10)
+    )
+    app.before_request(start_request_timing)
+    app.after_request(finish_request_timing)